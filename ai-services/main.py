@@ -12,13 +12,26 @@ q = asyncio.Queue(maxsize=15)
 
 CORE_BASE_URL = os.getenv('CORE_BASEURL', 'http://back:1000')
 
+# shared keep-alive session for all calls back to the core service
+core_session: aiohttp.ClientSession | None = None
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global core_session
+    core_session = aiohttp.ClientSession(
+        base_url=CORE_BASE_URL,
+        connector=aiohttp.TCPConnector(
+            limit_per_host=int(os.getenv('CORE_POOL_SIZE', 8)),
+            keepalive_timeout=30,
+        ),
+        timeout=aiohttp.ClientTimeout(total=float(os.getenv('CORE_TIMEOUT', 30))),
+    )
     logging.info('Starting up - launching worker')
     asyncio.create_task(post_analysis())
     yield
     logging.info('Shutting down')
+    await core_session.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -33,35 +46,32 @@ app.add_middleware(
 
 
 async def fetch_post_for_task(task_id: int, token: str) -> dict:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"{CORE_BASE_URL}/api/aiservice/task_post",
-            headers={"Authorization": f"Bearer {token}"}
-        ) as resp:
-            resp.raise_for_status()
-            return await resp.json()
+    async with core_session.get(
+        "/api/aiservice/task_post",
+        headers={"Authorization": f"Bearer {token}"}
+    ) as resp:
+        resp.raise_for_status()
+        return await resp.json()
 
 
 async def submit_analysis_result(result: dict, token: str):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            f"{CORE_BASE_URL}/api/aiservice/submit_analysis",
-            json=result,
-            headers={"Authorization": f"Bearer {token}"}
-        ) as resp:
-            resp.raise_for_status()
-            return await resp.json()
+    async with core_session.post(
+        "/api/aiservice/submit_analysis",
+        json=result,
+        headers={"Authorization": f"Bearer {token}"}
+    ) as resp:
+        resp.raise_for_status()
+        return await resp.json()
 
 
 async def submit_error(task_id: int, error: str, token: str):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            f"{CORE_BASE_URL}/api/aiservice/submit_error",
-            json={"task_id": task_id, "error": error},
-            headers={"Authorization": f"Bearer {token}"}
-        ) as resp:
-            resp.raise_for_status()
-            return await resp.json()
+    async with core_session.post(
+        "/api/aiservice/submit_error",
+        json={"task_id": task_id, "error": error},
+        headers={"Authorization": f"Bearer {token}"}
+    ) as resp:
+        resp.raise_for_status()
+        return await resp.json()
 
 
 @app.post('/start_analysis/{task_id}')
@@ -1,4 +1,4 @@
-import os, logging, string, asyncio, aiohttp
+import os, logging, string, asyncio
 
 logging.basicConfig(level=logging.WARNING)
 from fastapi import Depends, HTTPException, APIRouter
@@ -7,6 +7,7 @@ from typing import Optional
 from uuid import uuid4
 from utils import *
 from postgres_conn import *
+from http_clients import http_clients
 from authx import AuthX, AuthXConfig, TokenPayload
 from sqlalchemy.orm import with_loader_criteria
 
@@ -36,14 +37,12 @@ async def auth_ai(req_id: int):
 
 
 async def start_analysis(task: PostAnalysisRequest, token: str):
-    url = os.getenv('AI_SERVICE_BASEURL', 'http://ai:3000')
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{url}/start_analysis/{task.id}", 
-                headers={"Authorization": f"Bearer {token}"} 
-            ) as resp:
-                resp.raise_for_status()
+        async with http_clients.get('ai').post(
+            f"/start_analysis/{task.id}", 
+            headers={"Authorization": f"Bearer {token}"} 
+        ) as resp:
+            resp.raise_for_status()
     except Exception as e:
         logging.error(f"Failed to trigger AI service for task {task.id}: {e}")
         raise
@@ -18,7 +18,7 @@ from typing import Optional
 from uuid import uuid4
 from utils import *
 from vecutils import *
-from ranking import fetch_useful_businessmen
+from ranking import fetch_useful_businessmen, fetch_contacts_page
 from postgres_conn import User, UserAuth, get_db, Community, Post, Business
 from minio_conn import (
     upload_business_avatar, fetch_business_avatar, delete_business_avatar,
@@ -81,9 +81,7 @@ async def get_business_ep(
     user_id: int = Depends(get_user_id_from_token),
 ):
     business = await get_business(business_id, user_id, db)
-    verifications_count = {}
-    for v in business.verifications:
-        verifications_count[v.type] = verifications_count.get(v.type, 0) + 1
+    verifications_count = verification_counts(business)
     return BusinessResponse(
         id=business.id,
         name=business.name,
@@ -114,14 +112,11 @@ async def get_newcomers_ep(
     
     result = []
     for b in newcomers:
-        verifications_count = {}
-        for v in b.verifications:
-            verifications_count[v.type] = verifications_count.get(v.type, 0) + 1
         result.append({
             'id': b.id,
             'name': b.name,
             'bio': b.bio,
-            'verifications': verifications_count,
+            'verifications': verification_counts(b),
             'user_id': b.user_id,
             'reaction_time': b.reaction_time,
             'cont_goal': b.cont_goal,
@@ -157,6 +152,24 @@ async def get_contacts(
     return contacts
 
 
+@router.post('/get_contacts_page', response_model=ContactsPage)
+async def get_contacts_page(
+    req: GetContactsPageRequest,
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(get_user_id_from_token),
+):
+    page = await fetch_contacts_page(
+        req.n            ,
+        user_id          ,
+        req.community_id ,
+        req.post_id      ,
+        req.cursor       ,
+        db               ,
+    )
+
+    return page
+
+
 @router.post('/connect')
 async def connect_ep(
     req: ConnectRequest,
@@ -2,7 +2,7 @@ import os
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
-from fastapi import Depends, HTTPException, APIRouter, WebSocket
+from fastapi import Depends, HTTPException, APIRouter, WebSocket, Response
 from auth import auth, get_user_id_from_token
 from authx import TokenPayload
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -44,11 +44,15 @@ manager = ConnectionManager()
 @router.get('/')
 async def get_user_conversations_ep(
     n: int,
-    offset: int,
+    response: Response,
+    offset: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token),
 ):
-    convos = await get_user_conversations(n, offset, db, user_id)
+    convos, next_cursor = await get_user_conversations(n, offset, db, user_id, cursor)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return convos
 
 
@@ -114,15 +118,20 @@ async def websocket_chat(
         manager.disconnect(ws, conversation_id)
 
 
+@router.get('/{conversation_id}/{n}')
 @router.get('/{conversation_id}/{n}/{offset}')
 async def get_messages_ep(
     conversation_id: int,
     n: int,
-    offset: int,
+    response: Response,
+    offset: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token)
 ):
-    messages = await get_messages(conversation_id, n, offset, db, user_id)
+    messages, next_cursor = await get_messages(conversation_id, n, offset, db, user_id, cursor)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return messages
 
 
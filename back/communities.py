@@ -1,7 +1,6 @@
 import os
 import logging
-import aiohttp
-from fastapi import Depends, HTTPException, APIRouter, UploadFile, File
+from fastapi import Depends, HTTPException, APIRouter, UploadFile, File, Response
 from fastapi.responses import StreamingResponse
 
 logging.basicConfig(level=logging.DEBUG)
@@ -16,6 +15,7 @@ from typing import Optional
 from uuid import uuid4
 from utils import *
 from postgres_conn import User, UserAuth, get_db, Community
+from http_clients import http_clients
 from minio_conn import (
     upload_community_avatar, fetch_community_avatar, delete_community_avatar,
 )
@@ -23,22 +23,20 @@ from minio_conn import (
 router = APIRouter(prefix="/api/comm", tags=["communities"])
 
 
-INTEGRATIONS_BASE = os.getenv('INTEGRATIONS_BASE', 'http://integrations:3000')
-
-
 @router.post("/create")
 async def create_community_ep(
     req: CreateCommunityRequest,
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token),
 ):
-    await moderate(db, req.description, req.name)
+    if not ASYNC_MODERATION:
+        await moderate(db, req.description, req.name)
 
     community = await create_community(req, user_id, db)
     await db.commit()
     await db.refresh(community)
 
-    return {"community created": f"{req.name}", "community_id": community.id}
+    return {"community created": f"{req.name}", "community_id": community.id, "moderation_status": community.moderation_status}
 
 
 @router.delete("/del/{community_id}")
@@ -82,15 +80,15 @@ async def get_community_unauth(
         reddit_name = community.reddit_link.replace('reddit.com/', '').replace('/r/', '').replace('r/', '').strip()
         if reddit_name:
             try:
-                async with aiohttp.ClientSession(base_url=INTEGRATIONS_BASE) as client:
-                    async with client.get(f'/get-subreddit-participants/{reddit_name}') as resp:
-                        if resp.status == 200:
-                            data = await resp.json()
-                            reddit_subscribers = int(data.get('subscribers', 0))
-                    async with client.get(f'/reddit/get-description/{reddit_name}') as resp:
-                        if resp.status == 200:
-                            data = await resp.json()
-                            reddit_description = data.get('description')
+                client = http_clients.get('integrations')
+                async with client.get(f'/get-subreddit-participants/{reddit_name}') as resp:
+                    if resp.status == 200:
+                        data = await resp.json()
+                        reddit_subscribers = int(data.get('subscribers', 0))
+                async with client.get(f'/reddit/get-description/{reddit_name}') as resp:
+                    if resp.status == 200:
+                        data = await resp.json()
+                        reddit_description = data.get('description')
             except Exception as e:
                 logging.warning(f"Failed to fetch reddit data for {reddit_name}: {e}")
 
@@ -139,15 +137,15 @@ async def get_community_ep(
         reddit_name = community.reddit_link.replace('reddit.com/', '').replace('/r/', '').replace('r/', '').strip()
         if reddit_name:
             try:
-                async with aiohttp.ClientSession(base_url=INTEGRATIONS_BASE) as client:
-                    async with client.get(f'/get-subreddit-participants/{reddit_name}') as resp:
-                        if resp.status == 200:
-                            data = await resp.json()
-                            reddit_subscribers = int(data.get('subscribers', 0))
-                    async with client.get(f'/reddit/get-description/{reddit_name}') as resp:
-                        if resp.status == 200:
-                            data = await resp.json()
-                            reddit_description = data.get('description')
+                client = http_clients.get('integrations')
+                async with client.get(f'/get-subreddit-participants/{reddit_name}') as resp:
+                    if resp.status == 200:
+                        data = await resp.json()
+                        reddit_subscribers = int(data.get('subscribers', 0))
+                async with client.get(f'/reddit/get-description/{reddit_name}') as resp:
+                    if resp.status == 200:
+                        data = await resp.json()
+                        reddit_description = data.get('description')
             except Exception as e:
                 logging.warning(f"Failed to fetch reddit data for {reddit_name}: {e}")
 
@@ -173,7 +171,8 @@ async def edit_community_ep(
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token)
 ):
-    await moderate(db, req.description)
+    if not ASYNC_MODERATION:
+        await moderate(db, req.description)
     
     edit_community(req, db, user_id)
     await db.commit()
@@ -194,17 +193,16 @@ async def change_moderators_ep(
 @router.post('/list_communities')
 async def list_communities_ep(
     req: ListCommunitiesRequest,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token),
 ):
     match req.sorting:
         case 'popular':
-            communities = await list_popular_communities(req.n, req.offset, db, user_id)
-            return communities
+            communities, next_cursor = await list_popular_communities(req.n, req.offset, db, user_id, req.cursor)
 
         case 'new':
-            communities = await list_new_communities(req.n, req.offset, db, user_id)
-            return communities
+            communities, next_cursor = await list_new_communities(req.n, req.offset, db, user_id, req.cursor)
 
         case 'relevant':
             raise HTTPException(status_code=404, detail='Not implemented')
@@ -213,6 +211,10 @@ async def list_communities_ep(
         case _:
             raise HTTPException(status_code=404, detail='Sorting does not exist')
 
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return communities
+
 @router.post('/search')
 async def search_communities_ep(
     req: SearchCommunitiesRequest,
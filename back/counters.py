@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from os import environ as env
+
+from sqlalchemy import text
+
+from postgres_conn import async_session, run_exclusive_periodic
+
+
+COUNTERS_RECONCILE_SECONDS = float(env.get('COUNTERS_RECONCILE_SECONDS', 6 * 3600))
+COUNTERS_LOCK = 7341003
+
+
+# counter -> statement rewriting only the rows that drifted from a full recount
+RECONCILE = {
+    'communities.participant_count': """
+        UPDATE communities c
+        SET participant_count = s.n
+        FROM (
+            SELECT c2.id, count(pl.id) AS n
+            FROM communities c2
+            LEFT JOIN participantslink pl ON pl.community_id = c2.id
+            GROUP BY c2.id
+        ) s
+        WHERE s.id = c.id AND c.participant_count <> s.n
+    """,
+    'communities.post_count': """
+        UPDATE communities c
+        SET post_count = s.n
+        FROM (
+            SELECT c2.id, count(p.id) AS n
+            FROM communities c2
+            LEFT JOIN posts p ON p.community_id = c2.id AND p.moderation_status = 'approved'
+            GROUP BY c2.id
+        ) s
+        WHERE s.id = c.id AND c.post_count <> s.n
+    """,
+    'posts.vote_count': """
+        UPDATE posts p
+        SET vote_count = s.n,
+            would_pay_median = s.median
+        FROM (
+            SELECT p2.id, count(v.id) AS n,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY v.would_pay) AS median
+            FROM posts p2
+            LEFT JOIN votes v ON v.post_id = p2.id AND v.moderation_status = 'approved'
+            GROUP BY p2.id
+        ) s
+        WHERE s.id = p.id
+          AND (p.vote_count <> s.n OR p.would_pay_median IS DISTINCT FROM s.median)
+    """,
+    # kept by utils.verify_business rather than a trigger, see VERIFICATION_COLUMNS
+    'businesses.verif_*': """
+        UPDATE businesses b
+        SET verif_seen = s.seen,
+            verif_used = s.used,
+            verif_coop = s.coop,
+            verif_score = s.coop * 3 + s.used * 2 + s.seen
+        FROM (
+            SELECT b2.id,
+                   count(v.id) FILTER (WHERE v.type = 'seen') AS seen,
+                   count(v.id) FILTER (WHERE v.type IN ('use', 'used')) AS used,
+                   count(v.id) FILTER (WHERE v.type = 'coop') AS coop
+            FROM businesses b2
+            LEFT JOIN verifications v ON v.business_id = b2.id
+            GROUP BY b2.id
+        ) s
+        WHERE s.id = b.id
+          AND (b.verif_seen, b.verif_used, b.verif_coop, b.verif_score)
+              IS DISTINCT FROM (s.seen, s.used, s.coop, s.coop * 3 + s.used * 2 + s.seen)
+    """,
+}
+
+
+async def reconcile_counters() -> dict:
+    repaired = {}
+    for counter, statement in RECONCILE.items():
+        # one transaction per counter, so a long recount of one table does not hold locks on the others
+        async with async_session() as db:
+            result = await db.execute(text(statement))
+            await db.commit()
+            repaired[counter] = result.rowcount
+
+    drifted = {counter: n for counter, n in repaired.items() if n}
+    if drifted:
+        logging.warning(f"counters: repaired drift {drifted}")
+    return repaired
+
+
+async def run_counter_reconciler():
+    await run_exclusive_periodic(COUNTERS_LOCK, COUNTERS_RECONCILE_SECONDS, reconcile_counters, 'Counter reconciler')
+
+
+if __name__ == "__main__":
+    print(asyncio.run(reconcile_counters()))
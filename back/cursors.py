@@ -0,0 +1,52 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, tuple_
+
+
+# Opaque pagination cursors: the client only echoes them back, so the payload
+# can change shape without an API change.
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return payload
+
+
+# Keyset ("seek") pagination: the cursor carries the sort key of the last row
+# served and the next page starts strictly after it, so a page costs the same
+# at any depth. Every order used with it ends in a unique column (the id).
+
+def keyset_cursor(values: list) -> str:
+    return encode_cursor({'k': [v.isoformat() if isinstance(v, datetime) else v for v in values]})
+
+
+def seek(stmt, columns: list, cursor: str | None, descending: bool = True):
+    if not cursor:
+        return stmt
+
+    values = decode_cursor(cursor).get('k')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    try:
+        values = [
+            datetime.fromisoformat(v) if isinstance(column.type, DateTime) and v is not None else v
+            for column, v in zip(columns, values)
+        ]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+    key, last = tuple_(*columns), tuple_(*values)
+    return stmt.where(key < last if descending else key > last)
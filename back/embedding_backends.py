@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import logging
+import re
+from abc import ABC, abstractmethod
+from os import environ as env
+from typing import List
+
+import numpy as np
+
+from http_clients import http_clients
+
+
+class EmbeddingBackend(ABC):
+    dim: int = 768
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        # part of the embedding cache key, so vectors of different backends never mix
+        ...
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+
+class OllamaBackend(EmbeddingBackend):
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def model_id(self) -> str:
+        return self.model
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        async with http_clients.get('ollama').post('/api/embed',
+                                                   json={
+                                                       'model': self.model,
+                                                       'input': texts,
+                                                   }) as resp:
+            resp.raise_for_status()
+
+            data = await resp.json()
+            logging.info(f"vector length: {len(data['embeddings'][0])}")
+            return data['embeddings']
+
+
+class HashingBackend(EmbeddingBackend):
+    # Deterministic, model-free vectors for load tests: words, word bigrams and
+    # character trigrams are hashed into signed buckets (a sparse random projection),
+    # so texts sharing vocabulary still land close to each other.
+
+    def __init__(self, dim: int = 768, delay_ms: float = 0.0):
+        self.dim = dim
+        self.delay_ms = delay_ms
+
+    @property
+    def model_id(self) -> str:
+        return f"hashing-{self.dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = re.findall(r'\w+', text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for token in tokens:
+            padded = f" {token} "
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features or ['<empty>']
+
+    def embed_one(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            vec[h % self.dim] += 1.0 if h >> 63 else -1.0
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec /= norm
+        return vec.tolist()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if self.delay_ms:
+            await asyncio.sleep(self.delay_ms / 1000)
+        return [self.embed_one(text) for text in texts]
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    kind = env.get('EMBEDDING_BACKEND', 'ollama')
+    match kind:
+        case 'ollama':
+            return OllamaBackend(env.get('LLM_MODEL', 'embeddinggemma'))
+        case 'hashing':
+            return HashingBackend(
+                dim=int(env.get('EMBEDDING_DIM', 768)),
+                delay_ms=float(env.get('EMBEDDING_HASHING_DELAY_MS', 0)),
+            )
+        case _:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND: {kind}")
+
+
+embedding_backend = get_embedding_backend()
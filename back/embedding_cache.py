@@ -0,0 +1,119 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from os import environ as env
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from valkey_conn import valkey_client
+
+
+# Two tiers: an in-process LRU in front of Valkey keys that expire after a TTL.
+# Only texts missed by both tiers are handed over to the embedding model.
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(str(text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, max_items: int, ttl: int):
+        self.max_items = max_items
+        self.ttl = ttl
+        # float32 arrays: ~3 KB per 768-dim vector against ~25 KB as a list of Python floats
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.stats = {
+            'lru_hits': 0,
+            'valkey_hits': 0,
+            'misses': 0,
+            'computed': 0,
+            'model_calls': 0,
+        }
+
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        emb = self._lru.get(key)
+        if emb is None:
+            return None
+        self._lru.move_to_end(key)
+        return emb.tolist()
+
+    def _lru_put(self, key: str, emb: List[float]):
+        self._lru[key] = np.asarray(emb, dtype=np.float32)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    async def get_or_compute(
+        self,
+        model: str,
+        texts: List[str],
+        compute: Callable[[List[str]], Awaitable[List[List[float]]]],
+    ) -> List[List[float]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+
+        for i, text in enumerate(texts):
+            key = cache_key(model, text)
+            emb = self._lru_get(key)
+            if emb is not None:
+                results[i] = emb
+                self.stats['lru_hits'] += 1
+            else:
+                pending.setdefault(key, []).append(i)
+
+        if pending and valkey_client.redis:
+            try:
+                keys = list(pending)
+                cached = await valkey_client.get_cached_embeddings(keys)
+                for key, emb in zip(keys, cached):
+                    if emb is None:
+                        continue
+                    self._lru_put(key, emb)
+                    for i in pending.pop(key):
+                        results[i] = emb
+                        self.stats['valkey_hits'] += 1
+            except Exception as e:
+                logging.warning(f'EmbeddingCache: valkey lookup failed, falling back to model: {e}')
+
+        if pending:
+            keys = list(pending)
+            self.stats['misses'] += sum(len(idx) for idx in pending.values())
+            self.stats['model_calls'] += 1
+            computed = await compute([texts[pending[key][0]] for key in keys])
+            self.stats['computed'] += len(computed)
+
+            fresh = {}
+            for key, emb in zip(keys, computed):
+                self._lru_put(key, emb)
+                fresh[key] = emb
+                for i in pending[key]:
+                    results[i] = emb
+
+            if valkey_client.redis:
+                try:
+                    await valkey_client.set_cached_embeddings(fresh, self.ttl)
+                except Exception as e:
+                    logging.warning(f'EmbeddingCache: could not store embeddings in valkey: {e}')
+
+        return results
+
+    def snapshot(self) -> dict:
+        hits = self.stats['lru_hits'] + self.stats['valkey_hits']
+        total = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'lru_size': len(self._lru),
+            'lru_bytes': sum(emb.nbytes for emb in self._lru.values()),
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    max_items=int(env.get('EMBEDDING_CACHE_SIZE', 16384)),
+    ttl=int(env.get('EMBEDDING_CACHE_TTL', 7 * 24 * 60 * 60)),
+)
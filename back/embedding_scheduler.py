@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from collections import deque
+from os import environ as env
+from typing import List
+
+from valkey_conn import valkey_client, EMBEDDING_LANES
+
+
+class BatchScheduler:
+    # Fits batch latency as overhead + per_item * size from recent Ollama calls
+    # and picks the largest batch that still fits the lane's latency target.
+
+    def __init__(self):
+        self.max_batch = int(env.get('EMBEDDING_MAX_BATCH', 64))
+        self.targets_ms = {
+            'interactive': float(env.get('EMBEDDING_TARGET_MS_INTERACTIVE', 200)),
+            'bulk': float(env.get('EMBEDDING_TARGET_MS_BULK', 200)),
+        }
+        self.max_wait_ms = {
+            'interactive': float(env.get('EMBEDDING_MAX_WAIT_MS_INTERACTIVE', 5)),
+            'bulk': float(env.get('EMBEDDING_MAX_WAIT_MS_BULK', 50)),
+        }
+        self.backlog_factor = float(env.get('EMBEDDING_BACKLOG_FACTOR', 2))
+        self.samples = deque(maxlen=50)
+        self.overhead_ms = 50.0
+        self.per_item_ms = 10.0
+
+    def observe(self, size: int, elapsed_ms: float):
+        self.samples.append((size, elapsed_ms))
+        n = len(self.samples)
+        mean_x = sum(s for s, _ in self.samples) / n
+        mean_y = sum(t for _, t in self.samples) / n
+        var_x = sum((s - mean_x) ** 2 for s, _ in self.samples)
+        if var_x > 0:
+            slope = sum((s - mean_x) * (t - mean_y) for s, t in self.samples) / var_x
+            self.per_item_ms = max(slope, 0.1)
+            self.overhead_ms = max(mean_y - self.per_item_ms * mean_x, 0.0)
+        else:
+            self.per_item_ms = max((mean_y - self.overhead_ms) / max(mean_x, 1), 0.1)
+
+    def _capacity(self, target_ms: float) -> int:
+        return int((target_ms - self.overhead_ms) / self.per_item_ms)
+
+    def batch_size(self, lane: str, depth: int) -> int:
+        target = self.targets_ms[lane]
+        size = self._capacity(target)
+        if depth > size:
+            # under backlog a somewhat slower batch drains the queue faster than several small ones
+            size = min(depth, self._capacity(target * self.backlog_factor))
+        return max(1, min(size, self.max_batch))
+
+    def snapshot(self) -> dict:
+        return {
+            'overhead_ms': round(self.overhead_ms, 2),
+            'per_item_ms': round(self.per_item_ms, 2),
+            'batch_size': {lane: self.batch_size(lane, 0) for lane in self.targets_ms},
+        }
+
+
+embedding_scheduler = BatchScheduler()
+
+
+async def collect_batch(consumer: str, scheduler: BatchScheduler = embedding_scheduler) -> List[dict]:
+    depth = await valkey_client.embedding_queue_depth()
+
+    tasks = []
+    for lane in EMBEDDING_LANES:
+        if depth[lane]:
+            tasks = await valkey_client.read_embedding_tasks(consumer, [lane], scheduler.batch_size(lane, depth[lane]))
+            if tasks:
+                break
+
+    if not tasks:
+        tasks = await valkey_client.read_embedding_tasks(
+            consumer, list(EMBEDDING_LANES), scheduler.batch_size('interactive', 0), block_ms=1000
+        )
+        if not tasks:
+            return []
+
+    # linger up to the lane's max wait so tasks arriving right behind this one share the batch
+    lane = 'interactive' if any(t['lane'] == 'interactive' for t in tasks) else 'bulk'
+    size = scheduler.batch_size(lane, depth[lane])
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + scheduler.max_wait_ms[lane] / 1000
+    while len(tasks) < size:
+        remaining_ms = int((deadline - loop.time()) * 1000)
+        if remaining_ms <= 0:
+            break
+        more = await valkey_client.read_embedding_tasks(consumer, [lane], size - len(tasks), block_ms=remaining_ms)
+        if not more:
+            break
+        tasks.extend(more)
+
+    logging.debug(f"collect_batch: {len(tasks)} tasks from lane {lane}, target size {size}")
+    return tasks
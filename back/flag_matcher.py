@@ -0,0 +1,98 @@
+from collections import deque
+from typing import Dict, Iterable, List
+
+
+# Obfuscations are folded away on both sides: the lexicon and the message go
+# through the same lowercase + leetspeak mapping before matching.
+LEET_MAP = str.maketrans({
+    '0': 'o',
+    '1': 'i',
+    '3': 'e',
+    '4': 'a',
+    '5': 's',
+    '7': 't',
+    '@': 'a',
+    '$': 's',
+    '!': 'i',
+})
+
+VOWELS = 'aeiou'
+
+
+def fold(text: str) -> str:
+    return text.lower().translate(LEET_MAP)
+
+
+def variants(term: str) -> List[str]:
+    # the term itself plus every spelling with one vowel masked by an asterisk
+    folded = fold(term)
+    out = [folded]
+    for i, ch in enumerate(folded):
+        if ch in VOWELS:
+            out.append(f"{folded[:i]}*{folded[i + 1:]}")
+    return out
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Dict[str, str]):
+        # patterns: folded pattern -> flag reported when it matches
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[str]] = [[]]
+
+        for pattern, flag in patterns.items():
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = nxt
+                state = nxt
+            if flag not in self.out[state]:
+                self.out[state].append(flag)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + [o for o in self.out[self.fail[nxt]] if o not in self.out[nxt]]
+
+    def iter_matches(self, text: str) -> Iterable[str]:
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield from out[state]
+
+    def find(self, message: str) -> List[str]:
+        found = []
+        seen = set()
+        for flag in self.iter_matches(fold(message)):
+            if flag not in seen:
+                found.append(flag)
+                seen.add(flag)
+        return found
+
+
+def build_flag_matcher(lexicon: Dict[str, Iterable[str]]) -> AhoCorasick:
+    # lexicon: language -> terms; all languages share one automaton since
+    # the message language is not known at moderation time
+    patterns = {}
+    for terms in lexicon.values():
+        for term in terms:
+            for variant in variants(term):
+                patterns.setdefault(variant, term)
+    return AhoCorasick(patterns)
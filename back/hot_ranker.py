@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from os import environ as env
+
+from sqlalchemy import text
+
+from postgres_conn import async_session, run_exclusive_periodic
+
+
+HOT_RANK_SECONDS = float(env.get('HOT_RANK_SECONDS', 300))
+# a post needs e times the signal of one posted this much later to rank level with it
+HOT_DECAY_HOURS = float(env.get('HOT_DECAY_HOURS', 12))
+HOT_PAY_WEIGHT = float(env.get('HOT_PAY_WEIGHT', 0.5))  # would_pay median signal relative to votes
+# older posts keep their last score; their votes rarely move and the decay has long settled their rank
+HOT_WINDOW_DAYS = int(env.get('HOT_WINDOW_DAYS', 30))
+# smaller score changes are not written, so a vote on a busy post does not rewrite its row
+HOT_EPSILON = float(env.get('HOT_EPSILON', 0.01))
+HOT_RANK_LOCK = 7341004
+
+
+# The score is log signal plus creation time over the decay, so it only moves when the post's votes do:
+# ordering by it is ordering by signal * exp(-age / decay), without rewriting every row as time passes.
+# That also keeps the popular feeds' keyset cursors valid across runs; only posts whose votes change
+# between two page requests can move past the cursor (be skipped or served twice).
+RANK_POSTS = text("""
+    INSERT INTO post_hot_scores (post_id, community_id, hot_score)
+    SELECT s.id, s.community_id, s.score
+    FROM (
+        SELECT p.id, p.community_id, h.post_id AS ranked, h.community_id AS ranked_community, h.hot_score,
+               ln(1 + p.vote_count::float8)
+               + CAST(:pay_weight AS float8) * ln(1 + greatest(coalesce(p.would_pay_median, 0), 0)::float8)
+               + extract(epoch FROM p.created_at)::float8 / CAST(:decay AS float8) AS score
+        FROM posts p
+        LEFT JOIN post_hot_scores h ON h.post_id = p.id
+        WHERE p.moderation_status = 'approved'
+          AND (h.post_id IS NULL OR p.created_at > now() - make_interval(days => CAST(:window AS int)))
+          AND (CAST(:ids AS bigint[]) IS NULL OR p.id = ANY(CAST(:ids AS bigint[])))
+    ) s
+    WHERE s.ranked IS NULL
+       OR s.ranked_community <> s.community_id
+       OR abs(s.hot_score - s.score) > CAST(:epsilon AS float8)
+    ON CONFLICT (post_id) DO UPDATE
+    SET community_id = excluded.community_id, hot_score = excluded.hot_score
+""")
+
+UNRANK_POSTS = text("""
+    DELETE FROM post_hot_scores h
+    USING posts p
+    WHERE p.id = h.post_id AND p.moderation_status <> 'approved'
+""")
+
+# a community is as hot as its posts together (log-sum-exp of their scores, as the scores are logs),
+# plus its own creation as one post without votes so new communities without posts still show up
+RANK_COMMUNITIES = text("""
+    WITH terms AS (
+        SELECT c.id AS community_id, extract(epoch FROM c.created_at)::float8 / CAST(:decay AS float8) AS score
+        FROM communities c
+        WHERE c.moderation_status = 'approved'
+          AND (CAST(:ids AS bigint[]) IS NULL OR c.id = ANY(CAST(:ids AS bigint[])))
+        UNION ALL
+        SELECT h.community_id, h.hot_score
+        FROM post_hot_scores h
+        JOIN communities c ON c.id = h.community_id AND c.moderation_status = 'approved'
+        WHERE CAST(:ids AS bigint[]) IS NULL OR c.id = ANY(CAST(:ids AS bigint[]))
+    ), peaks AS (
+        SELECT community_id, max(score) AS peak
+        FROM terms
+        GROUP BY community_id
+    )
+    INSERT INTO community_hot_scores (community_id, hot_score)
+    SELECT s.community_id, s.score
+    FROM (
+        -- exp() raises on underflow instead of returning 0, hence the floor
+        SELECT t.community_id, p.peak + ln(sum(exp(greatest(t.score - p.peak, -700)))) AS score
+        FROM terms t
+        JOIN peaks p ON p.community_id = t.community_id
+        GROUP BY t.community_id, p.peak
+    ) s
+    LEFT JOIN community_hot_scores h ON h.community_id = s.community_id
+    WHERE h.community_id IS NULL OR abs(h.hot_score - s.score) > CAST(:epsilon AS float8)
+    ON CONFLICT (community_id) DO UPDATE
+    SET hot_score = excluded.hot_score
+""")
+
+UNRANK_COMMUNITIES = text("""
+    DELETE FROM community_hot_scores h
+    USING communities c
+    WHERE c.id = h.community_id AND c.moderation_status <> 'approved'
+""")
+
+
+def post_params(post_ids: list[int] | None = None) -> dict:
+    return {
+        'pay_weight': HOT_PAY_WEIGHT,
+        'decay': HOT_DECAY_HOURS * 3600,
+        'window': HOT_WINDOW_DAYS,
+        'epsilon': HOT_EPSILON,
+        'ids': post_ids,
+    }
+
+
+def community_params(community_ids: list[int] | None = None) -> dict:
+    return {'decay': HOT_DECAY_HOURS * 3600, 'epsilon': HOT_EPSILON, 'ids': community_ids}
+
+
+async def rank_new(db, post_ids: list[int] = (), community_ids: list[int] = ()):
+    # scores just created or approved rows in the caller's transaction, so the popular listings
+    # show them right away instead of after the next run
+    if post_ids:
+        await db.execute(RANK_POSTS, post_params(list(post_ids)))
+    if community_ids:
+        await db.execute(RANK_COMMUNITIES, community_params(list(community_ids)))
+
+
+async def rank_hot() -> dict:
+    async with async_session() as db:
+        ranked = await db.execute(RANK_POSTS, post_params())
+        unranked = await db.execute(UNRANK_POSTS)
+        communities = await db.execute(RANK_COMMUNITIES, community_params())
+        await db.execute(UNRANK_COMMUNITIES)
+        await db.commit()
+
+    counts = {'posts': ranked.rowcount, 'unranked': unranked.rowcount, 'communities': communities.rowcount}
+    logging.info(f"hot ranker: {counts}")
+    return counts
+
+
+async def run_hot_ranker():
+    await run_exclusive_periodic(HOT_RANK_LOCK, HOT_RANK_SECONDS, rank_hot, 'Hot ranker', run_first=True)
+
+
+if __name__ == "__main__":
+    print(asyncio.run(rank_hot()))
@@ -0,0 +1,111 @@
+import logging
+import aiohttp
+from os import environ as env
+from typing import Dict
+
+
+# One long-lived session per upstream, so outbound calls reuse keep-alive
+# connections instead of paying a TCP handshake and DNS lookup every time.
+
+UPSTREAMS = {
+    'ollama': {
+        'base_url': env.get('LLM_BASE_URL', 'http://ollama-service:11434'),
+        'limit_per_host': int(env.get('OLLAMA_POOL_SIZE', 8)),
+        'timeout': float(env.get('OLLAMA_TIMEOUT', 30)),
+    },
+    'ai': {
+        'base_url': env.get('AI_SERVICE_BASEURL', 'http://ai:3000'),
+        'limit_per_host': int(env.get('AI_SERVICE_POOL_SIZE', 4)),
+        'timeout': float(env.get('AI_SERVICE_TIMEOUT', 10)),
+    },
+    'integrations': {
+        'base_url': env.get('INTEGRATIONS_BASE', 'http://integrations:3000'),
+        'limit_per_host': int(env.get('INTEGRATIONS_POOL_SIZE', 16)),
+        'timeout': float(env.get('INTEGRATIONS_TIMEOUT', 10)),
+    },
+    'sms': {
+        'base_url': None,  # SMS_RELAY_ADDR is a full URL
+        'limit_per_host': int(env.get('SMS_POOL_SIZE', 4)),
+        'timeout': float(env.get('SMS_TIMEOUT', 10)),
+    },
+}
+
+
+class HttpClients:
+    def __init__(self, upstreams: dict):
+        self.upstreams = upstreams
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self.stats = {
+            name: {'requests': 0, 'errors': 0, 'new_connections': 0, 'reused_connections': 0}
+            for name in upstreams
+        }
+
+    def _trace_config(self, name: str) -> aiohttp.TraceConfig:
+        stats = self.stats[name]
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            stats['requests'] += 1
+
+        async def on_request_exception(session, ctx, params):
+            stats['errors'] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            stats['new_connections'] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats['reused_connections'] += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    def get(self, name: str) -> aiohttp.ClientSession:
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            conf = self.upstreams[name]
+            connector = aiohttp.TCPConnector(
+                limit=int(env.get('HTTP_POOL_LIMIT', 100)),
+                limit_per_host=conf['limit_per_host'],
+                keepalive_timeout=float(env.get('HTTP_KEEPALIVE_TIMEOUT', 30)),
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(
+                base_url=conf['base_url'],
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=conf['timeout']),
+                trace_configs=[self._trace_config(name)],
+            )
+            self._sessions[name] = session
+        return session
+
+    async def start(self):
+        for name in self.upstreams:
+            self.get(name)
+        logging.info(f"HTTP clients started: {list(self.upstreams)}")
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    def metrics(self) -> dict:
+        metrics = {}
+        for name, stats in self.stats.items():
+            pool = {}
+            session = self._sessions.get(name)
+            if session is not None and not session.closed:
+                connector = session.connector
+                pool = {
+                    'limit': connector.limit,
+                    'limit_per_host': connector.limit_per_host,
+                    'in_use': len(getattr(connector, '_acquired', ())),
+                    'idle': sum(len(conns) for conns in getattr(connector, '_conns', {}).values()),
+                }
+            metrics[name] = {**stats, **pool}
+        return metrics
+
+
+http_clients = HttpClients(UPSTREAMS)
@@ -29,8 +29,15 @@ from aiapi import router as ai_router, ai_analysis_worker
 from notifications import router as notifications_router
 from utils import *
 from postgres_conn import get_db, init_db
-from vecutils import insert_redflag_intentions, run_embedding_worker
+from vecutils import seed_redflag_intentions, run_embedding_worker
+from moderation import run_moderation_worker
+from suggestions import run_suggestions_scheduler
+from counters import run_counter_reconciler
+from hot_ranker import run_hot_ranker
 from valkey_conn import init_valkey, close_valkey
+from embedding_cache import embedding_cache
+from embedding_scheduler import embedding_scheduler
+from http_clients import http_clients
 from dotenv import load_dotenv
 from os import environ as env
 
@@ -85,6 +92,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(auth_router)
@@ -106,6 +114,16 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/health/embeddings")
+async def embeddings_health():
+    return {"cache": embedding_cache.snapshot(), "scheduler": embedding_scheduler.snapshot()}
+
+
+@app.get("/health/http")
+async def http_health():
+    return {"upstreams": http_clients.metrics()}
+
+
 @app.post('/api/feedback')
 async def feedback_ep(
     req: FeedbackRequest,
@@ -120,26 +138,27 @@ async def feedback_ep(
 
 ### STARTUP AND SHUTDOWN EVENTS
 
-async def insert_init(db: AsyncSession):
-    await insert_redflag_intentions(db)
-    await db.commit()
-
 @app.on_event("startup")
 async def startup_event():
     logging.info("Starting up: initializing database...")
     try:
         logging.info("Starting up: connecting to valkey...")
         await init_valkey()
+        logging.info("Starting up: opening outbound HTTP clients...")
+        await http_clients.start()
         logging.info("Starting up: initializing file storage...")
         await init_minio()
         logging.info("Starting up: launching embedding worker...")
         asyncio.create_task(run_embedding_worker())
         await init_db()
-        logging.info("Database initialized, inserting redflag intentions...")
-        async for db in get_db():
-            await insert_redflag_intentions(db)
-            await db.commit()
+        logging.info("Database initialized, seeding redflag intentions in the background...")
+        asyncio.create_task(seed_redflag_intentions())
         asyncio.create_task(ai_analysis_worker())
+        asyncio.create_task(run_moderation_worker())
+        asyncio.create_task(backfill_business_terms())
+        asyncio.create_task(run_suggestions_scheduler())
+        asyncio.create_task(run_counter_reconciler())
+        asyncio.create_task(run_hot_ranker())
         logging.info("Startup event completed successfully")
 
     except Exception as err:
@@ -150,6 +169,7 @@ async def startup_event():
 async def shutdown_event():
     try:
         await close_valkey()
+        await http_clients.close()
 
     except Exception as err:
         pass
@@ -0,0 +1,30 @@
+"""moderation claims
+
+Revision ID: 1e6b9d4f2a70
+Revises: f3a8c1d60b95
+Create Date: 2026-10-19 10:12:05.842113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e6b9d4f2a70'
+down_revision: Union[str, Sequence[str], None] = 'f3a8c1d60b95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('posts', 'votes', 'communities'):
+        op.add_column(table, sa.Column('moderation_claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('posts', 'votes', 'communities'):
+        op.drop_column(table, 'moderation_claimed_at')
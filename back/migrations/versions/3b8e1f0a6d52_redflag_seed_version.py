@@ -0,0 +1,31 @@
+"""redflag seed version
+
+Revision ID: 3b8e1f0a6d52
+Revises: c519bf6e7e88
+Create Date: 2026-10-18 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e1f0a6d52'
+down_revision: Union[str, Sequence[str], None] = 'c519bf6e7e88'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('redflagintent', sa.Column('version', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index(op.f('ix_redflagintent_version'), 'redflagintent', ['version'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_redflagintent_version'), table_name='redflagintent')
+    op.drop_column('redflagintent', 'version')
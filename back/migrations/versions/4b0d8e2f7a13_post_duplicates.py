@@ -0,0 +1,39 @@
+"""post embedding hnsw and duplicates
+
+Revision ID: 4b0d8e2f7a13
+Revises: e91d4b6a0c27
+Create Date: 2026-10-18 15:06:31.482950
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b0d8e2f7a13'
+down_revision: Union[str, Sequence[str], None] = 'e91d4b6a0c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('duplicate_of', sa.BigInteger(), nullable=True))
+    op.create_foreign_key(None, 'posts', 'posts', ['duplicate_of'], ['id'], ondelete='SET NULL')
+    op.create_index(op.f('ix_posts_duplicate_of'), 'posts', ['duplicate_of'], unique=False)
+    op.create_index(
+        'ix_posts_embedding_hnsw', 'posts', ['embedding'], unique=False,
+        postgresql_using='hnsw',
+        postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_embedding_hnsw', table_name='posts')
+    op.drop_index(op.f('ix_posts_duplicate_of'), table_name='posts')
+    op.drop_constraint('posts_duplicate_of_fkey', 'posts', type_='foreignkey')
+    op.drop_column('posts', 'duplicate_of')
@@ -0,0 +1,29 @@
+"""reindex business terms
+
+Revision ID: 5b91e3a7c2d4
+Revises: 7d2c4f8b1e63
+Create Date: 2026-10-20 10:12:07.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b91e3a7c2d4'
+down_revision: Union[str, Sequence[str], None] = '7d2c4f8b1e63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the English stemmer changed (coffees -> coffee, not coffe); utils.backfill_business_terms
+    # rebuilds every business on the next startup
+    op.execute('DELETE FROM business_terms')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DELETE FROM business_terms')
@@ -0,0 +1,33 @@
+"""business embedding hnsw
+
+Revision ID: 5f7a9c3e2b41
+Revises: 8d4c2a7e9f10
+Create Date: 2026-10-18 11:40:52.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f7a9c3e2b41'
+down_revision: Union[str, Sequence[str], None] = '8d4c2a7e9f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_businesses_embedding_hnsw', 'businesses', ['embedding'], unique=False,
+        postgresql_using='hnsw',
+        postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_businesses_embedding_hnsw', table_name='businesses')
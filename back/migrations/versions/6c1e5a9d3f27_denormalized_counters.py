@@ -0,0 +1,71 @@
+"""denormalized community and post counters
+
+Revision ID: 6c1e5a9d3f27
+Revises: 4b0d8e2f7a13
+Create Date: 2026-10-18 15:48:09.117264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c1e5a9d3f27'
+down_revision: Union[str, Sequence[str], None] = '4b0d8e2f7a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('communities', sa.Column('participant_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('communities', sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('vote_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('would_pay_median', sa.Float(), nullable=True))
+    op.create_index('ix_votes_post_id', 'votes', ['post_id'], unique=False)
+
+    # the triggers keeping these current are installed by postgres_conn.init_db
+    op.execute("""
+        UPDATE communities c
+        SET participant_count = s.n
+        FROM (SELECT community_id, count(*) AS n FROM participantslink GROUP BY community_id) s
+        WHERE s.community_id = c.id
+    """)
+    op.execute("""
+        UPDATE communities c
+        SET post_count = s.n
+        FROM (
+            SELECT community_id, count(*) AS n
+            FROM posts
+            WHERE moderation_status = 'approved'
+            GROUP BY community_id
+        ) s
+        WHERE s.community_id = c.id
+    """)
+    op.execute("""
+        UPDATE posts p
+        SET vote_count = s.n,
+            would_pay_median = s.median
+        FROM (
+            SELECT post_id, count(*) AS n,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY would_pay) AS median
+            FROM votes
+            WHERE moderation_status = 'approved'
+            GROUP BY post_id
+        ) s
+        WHERE s.post_id = p.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS update_participant_count ON participantslink")
+    op.execute("DROP TRIGGER IF EXISTS update_post_count ON posts")
+    op.execute("DROP TRIGGER IF EXISTS update_vote_stats ON votes")
+    op.drop_index('ix_votes_post_id', table_name='votes')
+    op.drop_column('posts', 'would_pay_median')
+    op.drop_column('posts', 'vote_count')
+    op.drop_column('communities', 'post_count')
+    op.drop_column('communities', 'participant_count')
@@ -0,0 +1,40 @@
+"""conversation created_at not null
+
+Revision ID: 7d2c4f8b1e63
+Revises: 1e6b9d4f2a70
+Create Date: 2026-10-19 14:26:41.509382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2c4f8b1e63'
+down_revision: Union[str, Sequence[str], None] = '1e6b9d4f2a70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # rows inserted with an explicit NULL; their first message is the closest thing to a creation time
+    op.execute("""
+        UPDATE conversations c
+        SET created_at = coalesce((SELECT min(m.created_at) FROM messages m WHERE m.conversation_id = c.id), now())
+        WHERE c.created_at IS NULL
+    """)
+    op.alter_column(
+        'conversations', 'created_at',
+        existing_type=sa.DateTime(timezone=False), existing_server_default=sa.text('now()'), nullable=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        'conversations', 'created_at',
+        existing_type=sa.DateTime(timezone=False), existing_server_default=sa.text('now()'), nullable=True,
+    )
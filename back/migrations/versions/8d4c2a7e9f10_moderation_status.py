@@ -0,0 +1,35 @@
+"""moderation status
+
+Revision ID: 8d4c2a7e9f10
+Revises: 3b8e1f0a6d52
+Create Date: 2026-10-18 11:02:17.530941
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4c2a7e9f10'
+down_revision: Union[str, Sequence[str], None] = '3b8e1f0a6d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('posts', 'votes', 'communities'):
+        op.add_column(table, sa.Column('moderation_status', sa.String(length=16), server_default='approved', nullable=False))
+        op.create_index(
+            f'ix_{table}_moderation_pending', table, ['id'], unique=False,
+            postgresql_where=sa.text("moderation_status = 'pending'"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('posts', 'votes', 'communities'):
+        op.drop_index(f'ix_{table}_moderation_pending', table_name=table, postgresql_where=sa.text("moderation_status = 'pending'"))
+        op.drop_column(table, 'moderation_status')
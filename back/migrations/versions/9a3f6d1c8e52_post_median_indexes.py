@@ -0,0 +1,38 @@
+"""post median feed indexes
+
+Revision ID: 9a3f6d1c8e52
+Revises: 6c1e5a9d3f27
+Create Date: 2026-10-18 16:20:43.651390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3f6d1c8e52'
+down_revision: Union[str, Sequence[str], None] = '6c1e5a9d3f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_posts_community_median_asc', 'posts',
+        ['community_id', sa.text('would_pay_median ASC NULLS LAST'), 'id'], unique=False,
+        postgresql_where=sa.text("moderation_status = 'approved'"),
+    )
+    op.create_index(
+        'ix_posts_community_median_desc', 'posts',
+        ['community_id', sa.text('would_pay_median DESC NULLS LAST'), sa.text('id DESC')], unique=False,
+        postgresql_where=sa.text("moderation_status = 'approved'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_community_median_desc', table_name='posts', postgresql_where=sa.text("moderation_status = 'approved'"))
+    op.drop_index('ix_posts_community_median_asc', table_name='posts', postgresql_where=sa.text("moderation_status = 'approved'"))
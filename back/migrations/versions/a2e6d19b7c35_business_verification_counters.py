@@ -0,0 +1,47 @@
+"""business verification counters
+
+Revision ID: a2e6d19b7c35
+Revises: 5f7a9c3e2b41
+Create Date: 2026-10-18 12:05:31.884120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2e6d19b7c35'
+down_revision: Union[str, Sequence[str], None] = '5f7a9c3e2b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in ('verif_seen', 'verif_used', 'verif_coop', 'verif_score'):
+        op.add_column('businesses', sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+
+    op.execute("""
+        UPDATE businesses b
+        SET verif_seen = s.seen,
+            verif_used = s.used,
+            verif_coop = s.coop,
+            verif_score = s.coop * 3 + s.used * 2 + s.seen
+        FROM (
+            SELECT business_id,
+                   count(*) FILTER (WHERE type = 'seen') AS seen,
+                   count(*) FILTER (WHERE type IN ('use', 'used')) AS used,
+                   count(*) FILTER (WHERE type = 'coop') AS coop
+            FROM verifications
+            GROUP BY business_id
+        ) s
+        WHERE s.business_id = b.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in ('verif_score', 'verif_coop', 'verif_used', 'verif_seen'):
+        op.drop_column('businesses', column)
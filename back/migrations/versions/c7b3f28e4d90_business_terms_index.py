@@ -0,0 +1,40 @@
+"""business terms index
+
+Revision ID: c7b3f28e4d90
+Revises: a2e6d19b7c35
+Create Date: 2026-10-18 12:48:09.316552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7b3f28e4d90'
+down_revision: Union[str, Sequence[str], None] = 'a2e6d19b7c35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('businesses', sa.Column('language', sqlmodel.sql.sqltypes.AutoString(length=32), server_default='english', nullable=False))
+    # filled by utils.backfill_business_terms on startup
+    op.create_table('business_terms',
+    sa.Column('term', sa.String(length=64), nullable=False),
+    sa.Column('business_id', sa.BigInteger(), nullable=False),
+    sa.Column('weight', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['business_id'], ['businesses.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('term', 'business_id')
+    )
+    op.create_index(op.f('ix_business_terms_business_id'), 'business_terms', ['business_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_business_terms_business_id'), table_name='business_terms')
+    op.drop_table('business_terms')
+    op.drop_column('businesses', 'language')
@@ -0,0 +1,49 @@
+"""keyset pagination indexes
+
+Revision ID: d52b7e0a4c18
+Revises: 9a3f6d1c8e52
+Create Date: 2026-10-18 16:57:12.308845
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52b7e0a4c18'
+down_revision: Union[str, Sequence[str], None] = '9a3f6d1c8e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+APPROVED = sa.text("moderation_status = 'approved'")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_communities_created_at_id', 'communities',
+        [sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_where=APPROVED,
+    )
+    op.create_index(
+        'ix_conversations_created_at_id', 'conversations',
+        [sa.text('created_at DESC'), sa.text('id DESC')], unique=False,
+    )
+    op.create_index(
+        'ix_conversationparticipant_user_id', 'conversationparticipant',
+        ['user_id', 'conversation_id'], unique=False,
+    )
+    op.create_index(
+        'ix_messages_conversation_created_at', 'messages',
+        ['conversation_id', 'created_at', 'id'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_conversation_created_at', table_name='messages')
+    op.drop_index('ix_conversationparticipant_user_id', table_name='conversationparticipant')
+    op.drop_index('ix_conversations_created_at_id', table_name='conversations')
+    op.drop_index('ix_communities_created_at_id', table_name='communities', postgresql_where=APPROVED)
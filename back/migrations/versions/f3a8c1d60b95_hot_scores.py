@@ -0,0 +1,59 @@
+"""hot score tables
+
+Revision ID: f3a8c1d60b95
+Revises: d52b7e0a4c18
+Create Date: 2026-10-18 17:34:26.972014
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c1d60b95'
+down_revision: Union[str, Sequence[str], None] = 'd52b7e0a4c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # kept apart from posts and communities so a re-rank rewrites neither; hot_ranker.py fills them on startup
+    op.create_table('post_hot_scores',
+    sa.Column('post_id', sa.BigInteger(), nullable=False),
+    sa.Column('community_id', sa.BigInteger(), nullable=False),
+    sa.Column('hot_score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['community_id'], ['communities.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+    op.create_index(
+        'ix_post_hot_scores_score_id', 'post_hot_scores',
+        [sa.text('hot_score DESC'), sa.text('post_id DESC')], unique=False,
+    )
+    op.create_index(
+        'ix_post_hot_scores_community_score_id', 'post_hot_scores',
+        ['community_id', sa.text('hot_score DESC'), sa.text('post_id DESC')], unique=False,
+    )
+
+    op.create_table('community_hot_scores',
+    sa.Column('community_id', sa.BigInteger(), nullable=False),
+    sa.Column('hot_score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['community_id'], ['communities.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('community_id')
+    )
+    op.create_index(
+        'ix_community_hot_scores_score_id', 'community_hot_scores',
+        [sa.text('hot_score DESC'), sa.text('community_id DESC')], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_community_hot_scores_score_id', table_name='community_hot_scores')
+    op.drop_table('community_hot_scores')
+    op.drop_index('ix_post_hot_scores_community_score_id', table_name='post_hot_scores')
+    op.drop_index('ix_post_hot_scores_score_id', table_name='post_hot_scores')
+    op.drop_table('post_hot_scores')
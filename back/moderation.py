@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from os import environ as env
+from typing import List
+
+from sqlalchemy import select, or_
+
+from postgres_conn import async_session, Post, Vote, Community, DeviceToken
+from utils import red_flags_check, invalidate_post_matches, mark_duplicate_post
+from vecutils import get_embeddings, redflag_matcher
+from notifications import send_push
+from hot_ranker import rank_new
+
+
+MODERATION_BATCH = int(env.get('MODERATION_BATCH', 32))
+MODERATION_POLL_SECONDS = float(env.get('MODERATION_POLL_SECONDS', 1))
+# a claim older than this belongs to a worker that died mid-batch and is taken over
+MODERATION_CLAIM_TIMEOUT = float(env.get('MODERATION_CLAIM_TIMEOUT', 300))
+
+
+# kind -> (model, author column, fields checked one by one, text stored as the embedding)
+MODERATED = {
+    'post': (
+        Post, 'user_id',
+        lambda p: [p.contents, p.name],
+        lambda p: f"{p.name} {p.contents}",
+    ),
+    'vote': (
+        Vote, 'voter_id',
+        lambda v: [v.competition, v.problems],
+        lambda v: " ".join(t for t in (v.competition, v.problems) if t),
+    ),
+    'community': (
+        Community, 'creator_id',
+        lambda c: [c.description, c.name],
+        lambda c: f"{c.name} {c.description}",
+    ),
+}
+
+
+async def claim_batch(kind: str, limit: int) -> tuple[datetime, list[tuple]]:
+    # marks up to `limit` pending rows as taken and commits right away, so no row lock is held
+    # while the texts are embedded; returns the claim token and (id, checked fields, stored text)
+    model, _, fields_of, text_of = MODERATED[kind]
+    claimed_at = datetime.now(timezone.utc)
+
+    async with async_session() as db:
+        # several app instances can run the worker: each takes its own slice of pending rows
+        result = await db.execute(
+            select(model)
+            .where(
+                model.moderation_status == 'pending',
+                or_(
+                    model.moderation_claimed_at.is_(None),
+                    model.moderation_claimed_at < claimed_at - timedelta(seconds=MODERATION_CLAIM_TIMEOUT),
+                ),
+            )
+            .order_by(model.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        items = result.scalars().all()
+
+        claimed = []
+        for item in items:
+            item.moderation_claimed_at = claimed_at
+            claimed.append((item.id, [f for f in fields_of(item) if f], text_of(item)))
+        await db.commit()
+
+    return claimed_at, claimed
+
+
+async def moderate_batch(kind: str, limit: int = MODERATION_BATCH) -> int:
+    model, author_attr, _, _ = MODERATED[kind]
+
+    claimed_at, claimed = await claim_batch(kind, limit)
+    if not claimed:
+        return 0
+
+    # every field of every item plus the texts to store go through one embedding call
+    texts, spans = [], {}
+    for item_id, fields, stored in claimed:
+        spans[item_id] = (len(texts), len(texts) + len(fields))
+        texts.extend(fields)
+        texts.append(stored)
+    embeddings = await get_embeddings(texts, lane='bulk')
+
+    await redflag_matcher.ensure_fresh()
+    labels = redflag_matcher.match(embeddings)
+
+    async with async_session() as db:
+        # rows edited since the claim lost it (see utils.edit_post) and wait for the next batch
+        result = await db.execute(
+            select(model)
+            .where(
+                model.id.in_(list(spans)),
+                model.moderation_status == 'pending',
+                model.moderation_claimed_at == claimed_at,
+            )
+            .order_by(model.id)
+            .with_for_update()
+        )
+        items = result.scalars().all()
+
+        decisions = []
+        for item in items:
+            start, end = spans[item.id]
+            flagged = not red_flags_check(' '.join(texts[start:end]))
+            flagged = flagged or any(labels[start:end])
+            item.moderation_status = 'rejected' if flagged else 'approved'
+            item.moderation_claimed_at = None
+            item.embedding = embeddings[end]
+            decisions.append((getattr(item, author_attr), item.id, item.moderation_status))
+
+        # the session does not autoflush: write the approvals first so the duplicate search sees the
+        # earlier items of the batch, and each duplicate_of before the next item looks for its canonical post
+        canonical_ids = []
+        if kind == 'post':
+            for item in items:
+                await db.flush()
+                if item.moderation_status == 'approved' and item.duplicate_of is None:
+                    canonical_ids.append(await mark_duplicate_post(item, db))
+
+        # into the popular listings now rather than at the next hot_ranker run
+        await db.flush()
+        published = [item for item in items if item.moderation_status == 'approved']
+        if kind == 'post':
+            await rank_new(db, [p.id for p in published], {p.community_id for p in published})
+        elif kind == 'community':
+            await rank_new(db, community_ids=[c.id for c in published])
+
+        await db.commit()
+
+    # approved votes move the vote centroid, re-embedded posts move the post itself
+    if kind in ('post', 'vote'):
+        post_ids = {item.post_id if kind == 'vote' else item.id for item in items}
+        await invalidate_post_matches(list(post_ids | {i for i in canonical_ids if i}))
+
+    approved = sum(status == 'approved' for _, _, status in decisions)
+    logging.info(f"moderation: {kind} batch of {len(decisions)}, {approved} approved")
+
+    await notify_authors(kind, decisions)
+    return len(claimed)
+
+
+async def notify_authors(kind: str, decisions: List[tuple]):
+    user_ids = {user_id for user_id, _, _ in decisions}
+    async with async_session() as db:
+        result = await db.execute(
+            select(DeviceToken.user_id, DeviceToken.fcm_token)
+            .where(DeviceToken.user_id.in_(user_ids))
+        )
+        tokens = {}
+        for user_id, token in result.all():
+            tokens.setdefault(user_id, []).append(token)
+
+    for user_id, item_id, status in decisions:
+        if status == 'approved':
+            title, body = 'Published', f'Your {kind} passed moderation and is now visible'
+        else:
+            title, body = 'Rejected', f'Your {kind} did not pass moderation'
+        for token in tokens.get(user_id, []):
+            try:
+                # firebase_admin's send is blocking
+                await asyncio.to_thread(
+                    send_push, token, title, body,
+                    data={'type': 'moderation', 'kind': kind, 'id': str(item_id), 'status': status},
+                )
+            except Exception as e:
+                logging.error(f"Failed to send push to token {token}: {e}")
+
+
+async def run_moderation_worker():
+    while True:
+        try:
+            processed = 0
+            for kind in MODERATED:
+                processed += await moderate_batch(kind)
+
+            if not processed:
+                await asyncio.sleep(MODERATION_POLL_SECONDS)
+
+        except Exception as e:
+            logging.error(f"Moderation worker error: {e}")
+            await asyncio.sleep(10)
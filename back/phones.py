@@ -1,6 +1,7 @@
 import aiohttp
 from os import environ as env
 import logging
+from http_clients import http_clients
 
 sms_api_key = env.get("SMS_API_KEY", "DEFAULT KEY")
 sms_relay_addr = env.get("SMS_RELAY_ADDR")
@@ -18,14 +19,13 @@ async def send_sms(to: str, message: str):
     data = {"to": to, "message": message}
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(sms_relay_addr, headers=headers, json=data) as resp:
-                if resp.status == 200:
-                    logging.info("SMS sent successfully")
+        async with http_clients.get('sms').post(sms_relay_addr, headers=headers, json=data) as resp:
+            if resp.status == 200:
+                logging.info("SMS sent successfully")
 
-                else:
-                    error_text = await resp.text()
-                    logging.error(f"Failed to send SMS:\n{e}")
+            else:
+                error_text = await resp.text()
+                logging.error(f"Failed to send SMS:\n{error_text}")
 
     except aiohttp.ClientError as e:
         logging.error(f"Failed to send SMS to {to}: {e}")
@@ -3,12 +3,14 @@ from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.dialects.postgresql import TSVECTOR
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import DateTime, event, text, Index, PrimaryKeyConstraint
+from sqlalchemy import DateTime, Float, event, text, Index, PrimaryKeyConstraint
 from datetime import datetime
 from typing import List, Optional
 from enum import Enum
 
 from uuid import uuid4
+import asyncio
+import logging
 import os
 from os import environ as env
 from dotenv import load_dotenv
@@ -100,6 +102,7 @@ class BusinessOperationsLink(SQLModel, table=True):
 class ConversationParticipant(SQLModel, table=True):
     __table_args__ = (
         PrimaryKeyConstraint('conversation_id', 'user_id'),
+        Index('ix_conversationparticipant_user_id', 'user_id', 'conversation_id'),
     )
     conversation_id: int = Field(
         sa_column=Column(
@@ -176,6 +179,14 @@ class User(SQLModel, table=True):
 
 class Community(SQLModel, table=True):
     __tablename__ = 'communities'
+    __table_args__ = (
+        Index('ix_communities_moderation_pending', 'id', postgresql_where=text("moderation_status = 'pending'")),
+        # keyset pagination of the community listings (see cursors.seek)
+        Index(
+            'ix_communities_created_at_id', text('created_at DESC'), text('id DESC'),
+            postgresql_where=text("moderation_status = 'approved'"),
+        ),
+    )
         
     id: int = Field(primary_key=True, sa_type=BigInteger)
     
@@ -222,16 +233,32 @@ class Community(SQLModel, table=True):
         )
     )
 
+    # maintained by the triggers from create_counter_triggers, repaired by counters.reconcile_counters
+    participant_count: int = Field(default=0, sa_column=Column(Integer, server_default='0', nullable=False))
+    post_count: int = Field(default=0, sa_column=Column(Integer, server_default='0', nullable=False))  # approved posts
+
     embedding: List[float] | None = Field(
         sa_column=Column(Vector(768)),
         default = None
     ) # TODO recompute the vector each week (?) I guess
 
+    moderation_status: str = Field(
+        default='approved',
+        sa_column=Column(String(16), default='approved', server_default='approved', nullable=False)
+    ) # pending | approved | rejected
+    # set when a moderation worker takes the row; stale claims are retaken after MODERATION_CLAIM_TIMEOUT
+    moderation_claimed_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True)
+    )
+
 
 class Vote(SQLModel, table=True):
     __tablename__ = 'votes'
     __table_args__ = (
         UniqueConstraint("voter_id", "post_id", name='uq_vote'), 
+        Index('ix_votes_post_id', 'post_id'),
+        Index('ix_votes_moderation_pending', 'id', postgresql_where=text("moderation_status = 'pending'")),
     )
     
     id: int = Field(primary_key=True, sa_type=BigInteger)
@@ -259,9 +286,37 @@ class Vote(SQLModel, table=True):
         default = None
     )
 
+    moderation_status: str = Field(
+        default='approved',
+        sa_column=Column(String(16), default='approved', server_default='approved', nullable=False)
+    ) # pending | approved | rejected
+    # set when a moderation worker takes the row; stale claims are retaken after MODERATION_CLAIM_TIMEOUT
+    moderation_claimed_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True)
+    )
+
 
 class Post(SQLModel, table=True):
     __tablename__ = 'posts'
+    __table_args__ = (
+        Index('ix_posts_moderation_pending', 'id', postgresql_where=text("moderation_status = 'pending'")),
+        # keyset pagination of the popular feeds (see cursors.seek)
+        Index(
+            'ix_posts_community_median_asc', 'community_id', text('would_pay_median ASC NULLS LAST'), 'id',
+            postgresql_where=text("moderation_status = 'approved'"),
+        ),
+        Index(
+            'ix_posts_community_median_desc', 'community_id', text('would_pay_median DESC NULLS LAST'), text('id DESC'),
+            postgresql_where=text("moderation_status = 'approved'"),
+        ),
+        Index(
+            'ix_posts_embedding_hnsw', 'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_cosine_ops'},
+        ),
+    )
     
     id: int = Field(primary_key=True, sa_type=BigInteger)
 
@@ -310,6 +365,36 @@ class Post(SQLModel, table=True):
         sa_column = Column(Vector(768))
     )
 
+    moderation_status: str = Field(
+        default='approved',
+        sa_column=Column(String(16), default='approved', server_default='approved', nullable=False)
+    ) # pending | approved | rejected
+    # set when a moderation worker takes the row; stale claims are retaken after MODERATION_CLAIM_TIMEOUT
+    moderation_claimed_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True)
+    )
+
+    # approved votes; maintained by the votes trigger from create_counter_triggers
+    vote_count: int = Field(default=0, sa_column=Column(Integer, server_default='0', nullable=False))
+    would_pay_median: Optional[float] = Field(default=None, sa_column=Column(Float, nullable=True))
+
+    # earlier near-identical post in the same community; votes on this one go there
+    duplicate_of: Optional[int] = Field(
+        default=None,
+        sa_column=Column(
+            BigInteger,
+            ForeignKey('posts.id', ondelete='SET NULL'),
+            nullable=True,
+            index=True,
+        )
+    )
+
+
+# verification type -> counter column on businesses; the app sends 'use', older clients 'used'
+VERIFICATION_COLUMNS = {'seen': 'verif_seen', 'use': 'verif_used', 'used': 'verif_used', 'coop': 'verif_coop'}
+VERIFICATION_WEIGHTS = {'verif_coop': 3, 'verif_used': 2, 'verif_seen': 1}
+
 
 class Verification(SQLModel, table=True):
     __tablename__ = "verifications"
@@ -343,6 +428,12 @@ class Business(SQLModel, table=True):
     __tablename__ = 'businesses'
     __table_args__ = (
         UniqueConstraint("user_id", "name", name='uq_business'), 
+        Index(
+            'ix_businesses_embedding_hnsw', 'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_cosine_ops'},
+        ),
     )
     
     id: int = Field(primary_key=True, sa_type=BigInteger)
@@ -377,9 +468,109 @@ class Business(SQLModel, table=True):
         back_populates='business'
     )
 
+    # maintained by verify_business, so ranking never has to aggregate verifications
+    verif_seen: int = Field(default=0, sa_column=Column(Integer, default=0, server_default='0', nullable=False))
+    verif_used: int = Field(default=0, sa_column=Column(Integer, default=0, server_default='0', nullable=False))
+    verif_coop: int = Field(default=0, sa_column=Column(Integer, default=0, server_default='0', nullable=False))
+    verif_score: int = Field(default=0, sa_column=Column(Integer, default=0, server_default='0', nullable=False))
+
     embedding: List[float] = Field(
         sa_column = Column(Vector(768))
     )
+    language: str = Field(nullable=False, max_length=32, default="english", sa_column_kwargs={'server_default': 'english'})
+
+
+class BusinessTerm(SQLModel, table=True):
+    # inverted index over business bios, written by utils.index_business_terms
+    __tablename__ = 'business_terms'
+    __table_args__ = (
+        PrimaryKeyConstraint('term', 'business_id'),
+    )
+
+    term: str = Field(sa_column=Column(String(64), nullable=False))
+    business_id: int = Field(
+        sa_column=Column(
+            BigInteger,
+            ForeignKey('businesses.id', ondelete='CASCADE'),
+            nullable=False,
+            index=True,
+        )
+    )
+    weight: float = Field(nullable=False) # normalized log tf; idf is applied at query time
+
+
+class ContactSuggestion(SQLModel, table=True):
+    # precomputed by suggestions.compute_contact_suggestions, best first
+    __tablename__ = 'contact_suggestions'
+    __table_args__ = (
+        PrimaryKeyConstraint('user_id', 'community_id'),
+    )
+
+    user_id: int = Field(
+        sa_column=Column(
+            BigInteger,
+            ForeignKey('users.id', ondelete='CASCADE'),
+            nullable=False,
+        )
+    )
+    community_id: int = Field(
+        sa_column=Column(
+            BigInteger,
+            ForeignKey('communities.id', ondelete='CASCADE'),
+            nullable=False,
+        )
+    )
+    business_ids: List[int] = Field(sa_column=Column(ARRAY(BigInteger), nullable=False))
+    computed_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            server_default=func.now(),
+            nullable=False,
+        )
+    )
+
+
+class PostHotScore(SQLModel, table=True):
+    # written by hot_ranker.py, orders the popular feeds; kept off posts so a re-rank touches neither
+    # the wide posts rows nor their HNSW index
+    __tablename__ = 'post_hot_scores'
+    __table_args__ = (
+        Index('ix_post_hot_scores_score_id', text('hot_score DESC'), text('post_id DESC')),
+        Index('ix_post_hot_scores_community_score_id', 'community_id', text('hot_score DESC'), text('post_id DESC')),
+    )
+
+    post_id: int = Field(
+        sa_column=Column(
+            BigInteger,
+            ForeignKey('posts.id', ondelete='CASCADE'),
+            primary_key=True,
+        )
+    )
+    community_id: int = Field(
+        sa_column=Column(
+            BigInteger,
+            ForeignKey('communities.id', ondelete='CASCADE'),
+            nullable=False,
+        )
+    )
+    hot_score: float = Field(sa_column=Column(Float, nullable=False))
+
+
+class CommunityHotScore(SQLModel, table=True):
+    # written by hot_ranker.py, orders the popular listing
+    __tablename__ = 'community_hot_scores'
+    __table_args__ = (
+        Index('ix_community_hot_scores_score_id', text('hot_score DESC'), text('community_id DESC')),
+    )
+
+    community_id: int = Field(
+        sa_column=Column(
+            BigInteger,
+            ForeignKey('communities.id', ondelete='CASCADE'),
+            primary_key=True,
+        )
+    )
+    hot_score: float = Field(sa_column=Column(Float, nullable=False))
 
 
 class Connection(SQLModel, table=True):
@@ -407,11 +598,15 @@ class Connection(SQLModel, table=True):
 
 class Conversation(SQLModel, table=True):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        Index('ix_conversations_created_at_id', text('created_at DESC'), text('id DESC')),
+    )
 
     id: int = Field(primary_key=True, sa_type=BigInteger)
 
+    # part of the conversations keyset (see cursors.seek), which cannot step over NULLs
     created_at: datetime = Field(
-        sa_column=Column(DateTime(timezone=False), server_default=func.now())
+        sa_column=Column(DateTime(timezone=False), server_default=func.now(), nullable=False)
     )
 
     participants: List[User] = Relationship(
@@ -425,6 +620,9 @@ class Conversation(SQLModel, table=True):
 
 class Message(SQLModel, table=True):
     __tablename__='messages'
+    __table_args__ = (
+        Index('ix_messages_conversation_created_at', 'conversation_id', 'created_at', 'id'),
+    )
 
     id: int = Field(primary_key=True, sa_type=BigInteger)
     content: str = Field(sa_column=Column(String))
@@ -496,6 +694,7 @@ class RedFlagIntent(SQLModel, table=True):
 
     label: str = Field(sa_column=Column(String))
     embedding: List[float] = Field(sa_column=Column(Vector(768)))
+    version: str | None = Field(default=None, index=True) # hash of red_flags.py + embedding model
 
     
 class PostAnalysisRequest(SQLModel, table=True):
@@ -669,6 +868,34 @@ async def get_db():
             raise
 
 
+async def set_ef_search(db: AsyncSession, n: int):
+    # an HNSW scan returns at most ef_search rows and WHERE filters drop some of them
+    # afterwards, so it scans wider than the n rows the caller wants
+    await db.execute(text(f"SET LOCAL hnsw.ef_search = {min(max(n * 10, 100), 1000)}"))
+
+
+async def run_exclusive_periodic(lock_id: int, interval, job, name: str, run_first: bool = False):
+    """Run `job` every `interval` seconds (or a callable returning the seconds until the next run)
+    on whichever app instance takes the advisory lock `lock_id`."""
+    while True:
+        if not run_first:
+            await asyncio.sleep(interval() if callable(interval) else interval)
+        run_first = False
+
+        try:
+            async with async_session() as db:
+                # only one app instance runs the job
+                result = await db.execute(select(func.pg_try_advisory_lock(lock_id)))
+                if result.scalar():
+                    try:
+                        await job()
+                    finally:
+                        await db.execute(select(func.pg_advisory_unlock(lock_id)))
+
+        except Exception as e:
+            logging.error(f"{name} error: {e}")
+
+
 def create_post_search_trigger(conn):
     conn.execute(text(
         "DROP TRIGGER IF EXISTS update_post_search_vector ON posts"
@@ -731,6 +958,111 @@ def create_community_search_trigger(conn):
         """))
 
 
+def create_counter_triggers(conn):
+    conn.execute(text("DROP TRIGGER IF EXISTS update_participant_count ON participantslink"))
+    conn.execute(text("DROP TRIGGER IF EXISTS update_post_count ON posts"))
+    conn.execute(text("DROP TRIGGER IF EXISTS update_vote_stats ON votes"))
+
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION participant_count_trigger()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE communities SET participant_count = participant_count + 1 WHERE id = NEW.community_id;
+            ELSE
+                UPDATE communities SET participant_count = participant_count - 1 WHERE id = OLD.community_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    # only approved posts count; an UPDATE takes the old row off and puts the new one back
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION post_count_trigger()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                IF OLD.moderation_status = 'approved' THEN
+                    UPDATE communities SET post_count = post_count - 1 WHERE id = OLD.community_id;
+                END IF;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                IF NEW.moderation_status = 'approved' THEN
+                    UPDATE communities SET post_count = post_count + 1 WHERE id = NEW.community_id;
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    # a median cannot be maintained incrementally, so the post's approved votes are re-aggregated
+    # (one index range scan on ix_votes_post_id). The post row is locked first so the aggregate, a separate
+    # statement with its own snapshot, sees a concurrent vote on the same post once that one commits;
+    # NO KEY UPDATE leaves the votes foreign key's KEY SHARE lock alone, so two voters queue instead of deadlocking
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION refresh_post_vote_stats(target BIGINT)
+        RETURNS VOID AS $$
+        BEGIN
+            PERFORM 1 FROM posts WHERE id = target FOR NO KEY UPDATE;
+
+            UPDATE posts
+            SET vote_count = s.n,
+                would_pay_median = s.median
+            FROM (
+                SELECT count(*) AS n,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY would_pay) AS median
+                FROM votes
+                WHERE post_id = target AND moderation_status = 'approved'
+            ) s
+            WHERE posts.id = target;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION vote_stats_trigger()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM refresh_post_vote_stats(OLD.post_id);
+            END IF;
+            IF TG_OP = 'INSERT' THEN
+                PERFORM refresh_post_vote_stats(NEW.post_id);
+            ELSIF TG_OP = 'UPDATE' THEN
+                IF NEW.post_id <> OLD.post_id THEN
+                    PERFORM refresh_post_vote_stats(NEW.post_id);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    conn.execute(text("""
+        CREATE TRIGGER update_participant_count
+        AFTER INSERT OR DELETE
+        ON participantslink
+        FOR EACH ROW
+        EXECUTE FUNCTION participant_count_trigger()
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER update_post_count
+        AFTER INSERT OR DELETE OR UPDATE OF moderation_status, community_id
+        ON posts
+        FOR EACH ROW
+        EXECUTE FUNCTION post_count_trigger()
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER update_vote_stats
+        AFTER INSERT OR DELETE OR UPDATE OF post_id, would_pay, moderation_status
+        ON votes
+        FOR EACH ROW
+        EXECUTE FUNCTION vote_stats_trigger()
+    """))
+
+
 def install_pgvector(conn):
     result = conn.execute(text(
                      "SELECT extname FROM pg_extension WHERE extname = 'vector';"
@@ -750,6 +1082,7 @@ async def init_db():
         # await conn.run_sync(SQLModel.metadata.create_all)
         await conn.run_sync(create_post_search_trigger)
         await conn.run_sync(create_community_search_trigger)
+        await conn.run_sync(create_counter_triggers)
         
         # Add performance indexes for post queries
         # await conn.execute(text("""
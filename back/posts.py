@@ -1,6 +1,6 @@
 import os
 import logging
-from fastapi import Depends, HTTPException, APIRouter, UploadFile, File
+from fastapi import Depends, HTTPException, APIRouter, UploadFile, File, Response, Query
 from fastapi.responses import StreamingResponse, HTMLResponse
 
 logging.basicConfig(level=logging.DEBUG)
@@ -14,6 +14,7 @@ from typing import Optional
 from uuid import uuid4
 from utils import *
 from postgres_conn import User, UserAuth, get_db, Community, Post, PostAnalysis, PostAnalysisRequest
+from ranking import fetch_post_businesses
 from minio_conn import (
     upload_post_image, fetch_post_image, delete_post_image,
 )
@@ -26,13 +27,14 @@ async def create_post_ep(
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token),
 ):
-    await moderate(db, req.contents, req.name)
+    if not ASYNC_MODERATION:
+        await moderate(db, req.contents, req.name)
     
     post = await create_post(req, user_id, db)
     await db.commit()
     await db.refresh(post)
 
-    return {'id': post.id}
+    return {'id': post.id, 'moderation_status': post.moderation_status, 'duplicate_of': post.duplicate_of}
 
 
 @router.get('/g/{post_id}')
@@ -132,7 +134,8 @@ async def edit_post_ep(
     req: EditPostRequest,
     db: AsyncSession = Depends(get_db),
 ):
-    await moderate(db, req.contents)
+    if not ASYNC_MODERATION:
+        await moderate(db, req.contents)
     
     await edit_post(req, db)
     await db.commit()
@@ -146,32 +149,44 @@ async def vote_on_post_ep(
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token),
 ):
-    await moderate(db, req.competition, req.problems)
+    if not ASYNC_MODERATION:
+        await moderate(db, req.competition, req.problems)
     
     await vote_on_post(req, user_id, db)
     await db.commit()
 
-    return {'vote': 'put'}
+    return {'vote': 'pending' if ASYNC_MODERATION else 'put'}
     
 
+@router.get('/list_popular/{n}')
 @router.get('/list_popular/{n}/{offset}')
 async def list_posts(
     n: int,
-    offset: int,
+    response: Response,
+    offset: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    posts = await fetch_popular_posts(n, offset, db)
+    # with a cursor (from the previous page's X-Next-Cursor header) offset is ignored and can be left out
+    posts, next_cursor = await fetch_popular_posts(n, offset, db, cursor)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return posts
 
 
+@router.get('/list/{n}')
 @router.get('/list/{n}/{offset}')
 async def list_posts_for_user(
     n: int,
-    offset: int,
+    response: Response,
+    offset: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_token),
 ):
-    posts = await fetch_n_posts_for_user(user_id, n, offset, db)
+    posts, next_cursor = await fetch_n_posts_for_user(user_id, n, offset, db, cursor)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return posts
 
 
@@ -208,6 +223,28 @@ async def get_community_posts(
     return posts
 
 
+@router.get('/businesses/{post_id}', response_model=List[PostBusinessMatch])
+async def get_post_businesses_ep(
+    post_id: int,
+    n: int = Query(10, ge=1, le=100),
+    community_only: bool = True,
+    db: AsyncSession = Depends(get_db),
+):
+    matches = await fetch_post_businesses(post_id, n, community_only, db)
+    return matches
+
+
+@router.get('/similar/{post_id}', response_model=List[SimilarPost])
+async def get_similar_posts_ep(
+    post_id: int,
+    n: int = Query(10, ge=1, le=100),
+    community_only: bool = True,
+    db: AsyncSession = Depends(get_db),
+):
+    posts = await fetch_similar_posts(post_id, n, community_only, db)
+    return posts
+
+
 @router.post('/analyze/{post_id}')
 async def request_analysis_ep(
     post_id: int,
@@ -1,141 +1,482 @@
 from sqlalchemy.orm import Session, selectinload, defer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, desc, case, func, or_, and_
+from sqlalchemy import select, update, desc, case, func, or_, and_, text
 from fastapi import HTTPException
 from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from os import environ as env
+import logging
+import time
+import numpy as np
+from pgvector.sqlalchemy import Vector
 from schemas import *
 from postgres_conn import *
+from text_index import term_weights, idf
+from valkey_conn import valkey_client
+from cursors import encode_cursor, decode_cursor
 
 
-def extract_keywords(bio: str) -> set:
-    stop_words = {"the", "and", "for", "with", "like", "of", "a", "can"}
-    words = set(
-        word.lower()
-        for word in bio.split()
-        if len(word) > 3 and word.lower() not in stop_words
+# contacts are re-ranked in Python only over this many nearest neighbours of the requester
+CONTACT_CANDIDATES = int(env.get('CONTACT_CANDIDATES', 500))
+CONTACTS_CACHE_TTL = int(env.get('CONTACTS_CACHE_TTL', 300))
+BUSINESS_COUNT_TTL = int(env.get('BUSINESS_COUNT_TTL', 600))
+CONTACTS_SNAPSHOT_TTL = int(env.get('CONTACTS_SNAPSHOT_TTL', 1800))
+
+# share of the vote centroid in the post-to-business query vector
+POST_VOTE_BLEND = float(env.get('POST_VOTE_BLEND', 0.3))
+POST_BUSINESSES_TTL = int(env.get('POST_BUSINESSES_TTL', 3600))
+# nightly lists from suggestions.py older than this are ignored in favour of live ranking
+SUGGESTIONS_MAX_AGE_HOURS = float(env.get('SUGGESTIONS_MAX_AGE_HOURS', 36))
+
+RANK_WEIGHTS = {
+    'similarity': float(env.get('RANK_W_SIMILARITY', 1.0)),
+    'keyword': float(env.get('RANK_W_KEYWORD', 1.0)),
+    'community': float(env.get('RANK_W_COMMUNITY', 0.3)),  # relative boost for members of the community
+    'verification': float(env.get('RANK_W_VERIFICATION', 0.1)),
+}
+
+
+def requester_vector(embeddings: list) -> list[float] | None:
+    # mean of the unit-normalized bio/post embeddings, so one long bio does not dominate
+    vectors = [np.asarray(e, dtype=np.float32) for e in embeddings if e is not None]
+    vectors = [v / np.linalg.norm(v) for v in vectors if np.linalg.norm(v) > 0]
+    if not vectors:
+        return None
+    mean = np.mean(vectors, axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm).tolist() if norm > 0 else None
+
+
+async def fetch_candidate_businesses(
+    vector: list[float] | None,
+    bus_user_id: int,
+    db: AsyncSession,
+    limit: int = CONTACT_CANDIDATES,
+) -> tuple[list[Business], np.ndarray]:
+    # returns the candidates and their cosine similarity to the requester
+    base = (
+        select(Business)
+        .options(
+            selectinload(Business.user),
+            defer(Business.embedding),
+        )
+        .where(
+            Business.cont_goal.isnot(None),
+            Business.reaction_time.isnot(None),
+            Business.user_id != bus_user_id,
+        )
+        .limit(limit)
     )
-    return words
 
+    if vector is None:
+        # nothing embedded yet for this requester: newest businesses instead of a full scan
+        result = await db.execute(base.order_by(Business.created_at.desc()))
+        candidates = result.scalars().all()
+        return candidates, np.zeros(len(candidates), dtype=np.float32)
 
-def rank_entities(initiator_bio: str, businesses: list) -> list[dict]:
-    initiator_keywords = extract_keywords(initiator_bio)
-    ranked = []
-    for bus in businesses:
-        bus_keywords = extract_keywords(bus.bio)
-        intersection = initiator_keywords & bus_keywords
-        matches = len(intersection)
-        
-        if matches == 0:
-            score = 0
-        elif not initiator_keywords:
-            score = 0
-        else:
-            score = matches / len(intersection) * matches / len(initiator_keywords)
-        
-        ranked.append({"bus": bus, "score": score})
-    return sorted(ranked, key=lambda x: x["score"], reverse=True)
+    await set_ef_search(db, limit)
+    distance = Business.embedding.cosine_distance(vector)
+    result = await db.execute(
+        base.add_columns(distance.label('distance'))
+        .where(Business.embedding.isnot(None))
+        .order_by(distance)
+    )
+    rows = result.all()
+    return [row[0] for row in rows], 1 - np.array([row[1] for row in rows], dtype=np.float32)
 
 
-async def fetch_useful_businessmen(
+_business_count = (0, 0.0)  # (count, monotonic expiry)
+
+
+async def business_count(db: AsyncSession) -> int:
+    # N for idf; it moves slowly and idf is logarithmic in it, so a full count per request is not worth it
+    global _business_count
+    count, expires = _business_count
+    if time.monotonic() >= expires:
+        result = await db.execute(select(func.count(Business.id)))
+        count = result.scalar() or 0
+        _business_count = (count, time.monotonic() + BUSINESS_COUNT_TTL)
+    return count
+
+
+async def keyword_scores(query: str, language: str, business_ids: list[int], db: AsyncSession) -> dict[int, float]:
+    # tf-idf dot product between the requester text and the indexed bios,
+    # touching only postings of the requester's terms among the candidates
+    weights = term_weights(query, language)
+    if not weights or not business_ids:
+        return {}
+
+    n_docs = await business_count(db)
+
+    result = await db.execute(
+        select(BusinessTerm.term, func.count())
+        .where(BusinessTerm.term.in_(list(weights)))
+        .group_by(BusinessTerm.term)
+    )
+    idfs = {term: idf(df, n_docs) for term, df in result.all()}
+    if not idfs:
+        return {}
+
+    result = await db.execute(
+        select(BusinessTerm.business_id, BusinessTerm.term, BusinessTerm.weight)
+        .where(
+            BusinessTerm.term.in_(list(idfs)),
+            BusinessTerm.business_id.in_(business_ids),
+        )
+    )
+    scores = defaultdict(float)
+    for business_id, term, weight in result.all():
+        scores[business_id] += weights[term] * weight * idfs[term] ** 2
+
+    # scaled to [0, 1] so it stays comparable with the community and verification terms
+    top = max(scores.values(), default=0)
+    return {business_id: score / top for business_id, score in scores.items()} if top else {}
+
+
+def score_candidates(
+    similarity: np.ndarray,
+    keyword: np.ndarray,
+    in_community: np.ndarray,
+    verif_score: np.ndarray,
+    excluded: np.ndarray,
     n: int,
+    weights: dict = RANK_WEIGHTS,
+) -> tuple[np.ndarray, np.ndarray]:
+    # columnar scoring: one array per signal, one entry per candidate;
+    # returns positions of the top n candidates, best first, and their scores
+    scores = (
+        (weights['similarity'] * similarity + weights['keyword'] * keyword)
+        * (1 + weights['community'] * in_community)
+        + weights['verification'] * verif_score
+    )
+    scores = np.where(excluded, -np.inf, scores)
+
+    k = min(n, int((~excluded).sum()))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=scores.dtype)
+
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return top, scores[top]
+
+
+async def rank_contacts(
     bus_user_id: int,
     community_id: int,
     post_id: int,
     db: AsyncSession,
-) -> list[BusinessContact]:
+    candidates_limit: int = CONTACT_CANDIDATES,
+) -> list[int]:
+    # full ranking of candidate business ids, best first
     result = await db.execute(
-        select(User)
-        .options(selectinload(User.businesses))
-        .where(User.id == bus_user_id)
+        select(Business)
+        .where(Business.user_id == bus_user_id)
     )
-    bus_user = result.scalars().first()
-    
-    if not bus_user or not bus_user.entrep:
-        raise HTTPException(status_code=401, detail='User unable to request contacts')
+    own_businesses = result.scalars().all()
 
-    initiator_bios = [b.bio for b in bus_user.businesses if b.bio]
+    initiator_bios = [b.bio for b in own_businesses if b.bio]
     initiator_bio = " ".join(initiator_bios)
+    initiator_embeddings = [b.embedding for b in own_businesses]
+    language = own_businesses[0].language if own_businesses else 'english'
     
     if post_id:
         post = await db.get(Post, post_id)
         if post and post.contents:
             initiator_bio += f" {post.contents}"
+        if post:
+            initiator_embeddings.append(post.embedding)
+            language = post.language
+
+    candidates, similarity = await fetch_candidate_businesses(
+        requester_vector(initiator_embeddings), bus_user_id, db, candidates_limit
+    )
+
+    if not candidates:
+        raise HTTPException(status_code=404, detail='No candidate businesses found')
+
+    ids = np.array([c.id for c in candidates], dtype=np.int64)
+    user_ids = np.array([c.user_id for c in candidates], dtype=np.int64)
+
+    # contact_id is set to NULL when the contact's account is deleted
+    result = await db.execute(
+        select(Connection.contact_id)
+        .where(Connection.requester_id == bus_user_id, Connection.contact_id.isnot(None))
+    )
+    already_connected = np.array(result.scalars().all(), dtype=np.int64)
+
+    members = np.empty(0, dtype=np.int64)
+    if community_id:
+        result = await db.execute(
+            select(BusinessOperationsLink.business_id)
+            .where(
+                BusinessOperationsLink.community_id == community_id,
+                BusinessOperationsLink.business_id.in_(ids.tolist()),
+            )
+        )
+        members = np.array(result.scalars().all(), dtype=np.int64)
+
+    scores = await keyword_scores(initiator_bio, language, ids.tolist(), db)
+    keyword = np.array([scores.get(c.id, 0.0) for c in candidates], dtype=np.float32)
+    verif_score = np.array([c.verif_score for c in candidates], dtype=np.float32)
+
+    top, _ = score_candidates(
+        similarity,
+        keyword,
+        np.isin(ids, members).astype(np.float32),
+        verif_score,
+        np.isin(user_ids, already_connected),
+        len(candidates),
+    )
+    return ids[top].tolist()
+
+
+async def contacts_from_ids(business_ids: list[int], db: AsyncSession) -> list[BusinessContact]:
+    if not business_ids:
+        return []
 
     result = await db.execute(
         select(Business)
         .options(
             selectinload(Business.user),
-            selectinload(Business.communities),
             defer(Business.embedding),
         )
+        .where(Business.id.in_(business_ids))
+    )
+    by_id = {bus.id: bus for bus in result.scalars().all()}
+
+    # ranking order; businesses deleted since the ranking was cached drop out
+    return [
+        BusinessContact(
+            user_id=bus.user_id,
+            username=bus.user.username or "",
+            phone_number=bus.user.phone_number or "",
+            business_name=bus.name,
+            business_bio=bus.bio or "",
+            cont_goal=bus.cont_goal,
+            reaction_time=bus.reaction_time,
+            verification_stats={'seen': bus.verif_seen, 'used': bus.verif_used, 'coop': bus.verif_coop},
+        )
+        for bus in (by_id.get(business_id) for business_id in business_ids)
+        if bus is not None
+    ]
+
+
+async def suggested_contacts(bus_user_id: int, community_id: int, db: AsyncSession) -> list[int] | None:
+    result = await db.execute(
+        select(ContactSuggestion.business_ids)
+        .where(
+            ContactSuggestion.user_id == bus_user_id,
+            ContactSuggestion.community_id == community_id,
+            ContactSuggestion.computed_at > datetime.now(timezone.utc) - timedelta(hours=SUGGESTIONS_MAX_AGE_HOURS),
+        )
+    )
+    business_ids = result.scalar()
+    if not business_ids:
+        return None
+
+    # connections made and businesses deleted since the batch ran; NOT EXISTS rather than NOT IN,
+    # which matches nothing once an orphaned connection (contact_id NULL) is in the subquery
+    connected = (
+        select(Connection.id)
+        .where(Connection.requester_id == bus_user_id, Connection.contact_id == Business.user_id)
+        .exists()
+    )
+    result = await db.execute(
+        select(Business.id)
         .where(
-            Business.cont_goal.isnot(None),
-            Business.reaction_time.isnot(None),
-            Business.user_id != bus_user_id,
+            Business.id.in_(business_ids),
+            ~connected,
         )
     )
-    candidates = result.scalars().all()
+    still_valid = set(result.scalars().all())
+    # all of them gone: fall back to live ranking rather than an empty list until the next batch
+    return [business_id for business_id in business_ids if business_id in still_valid] or None
 
-    if not candidates:
-        raise HTTPException(status_code=404, detail='No candidate businesses found')
 
+async def get_contact_ranking(
+    bus_user_id: int,
+    community_id: int,
+    post_id: int,
+    db: AsyncSession,
+    use_cache: bool = True,
+) -> list[int]:
     result = await db.execute(
-        select(Connection.contact_id)
-        .where(Connection.requester_id == bus_user_id)
+        select(User.entrep)
+        .where(User.id == bus_user_id)
     )
-    already_connected = set(result.scalars().all())
+    entrep = result.scalar()
+    
+    if not entrep:
+        raise HTTPException(status_code=401, detail='User unable to request contacts')
 
-    ranked = rank_entities(initiator_bio, candidates)
+    ranking = None
+    if use_cache:
+        try:
+            ranking = await valkey_client.get_contact_ranking(bus_user_id, community_id, post_id)
+        except Exception as e:
+            logging.error(f"Could not read cached contacts for user {bus_user_id}: {e}")
 
-    verif_stats = {}
-    result = await db.execute(
-        select(
-            Verification.business_id,
-            Verification.type,
-            func.count(Verification.id)
+    if ranking is None and community_id and not post_id:
+        ranking = await suggested_contacts(bus_user_id, community_id, db)
+
+    if ranking is None:
+        ranking = await rank_contacts(bus_user_id, community_id, post_id, db)
+        if use_cache:
+            try:
+                await valkey_client.set_contact_ranking(bus_user_id, community_id, post_id, ranking, CONTACTS_CACHE_TTL)
+            except Exception as e:
+                logging.error(f"Could not cache contacts for user {bus_user_id}: {e}")
+
+    return ranking
+
+
+async def fetch_useful_businessmen(
+    n: int,
+    bus_user_id: int,
+    community_id: int,
+    post_id: int,
+    db: AsyncSession,
+    use_cache: bool = True,
+) -> list[BusinessContact]:
+    ranking = await get_contact_ranking(bus_user_id, community_id, post_id, db, use_cache)
+    return await contacts_from_ids(ranking[:n], db)
+
+
+async def fetch_contacts_page(
+    n: int,
+    bus_user_id: int,
+    community_id: int,
+    post_id: int,
+    cursor: str | None,
+    db: AsyncSession,
+) -> ContactsPage:
+    # LRANGE reads a negative stop index as counting from the end: n < 1 could return the whole snapshot
+    if n < 1:
+        raise HTTPException(status_code=400, detail='n must be at least 1')
+
+    # the first page freezes the ranking into a snapshot list; later pages are LRANGE slices of it
+    if cursor is None:
+        ranking = await get_contact_ranking(bus_user_id, community_id, post_id, db)
+        page_ids = ranking[:n]
+        next_cursor = None
+        if len(ranking) > n:
+            snapshot_id = await valkey_client.save_contact_snapshot(bus_user_id, ranking, CONTACTS_SNAPSHOT_TTL)
+            next_cursor = encode_cursor({'s': snapshot_id, 'o': n})
+        return ContactsPage(contacts=await contacts_from_ids(page_ids, db), next_cursor=next_cursor)
+
+    payload = decode_cursor(cursor)
+    snapshot_id, offset = payload.get('s'), payload.get('o')
+    if not isinstance(snapshot_id, str) or not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+    page_ids, total = await valkey_client.get_contact_snapshot_page(bus_user_id, snapshot_id, offset, n)
+    if page_ids is None:
+        raise HTTPException(status_code=410, detail='Cursor expired, start from the first page')
+
+    next_offset = offset + len(page_ids)
+    next_cursor = encode_cursor({'s': snapshot_id, 'o': next_offset}) if next_offset < total else None
+    return ContactsPage(contacts=await contacts_from_ids(page_ids, db), next_cursor=next_cursor)
+
+
+async def rank_post_businesses(
+    post: Post,
+    n: int,
+    community_only: bool,
+    db: AsyncSession,
+) -> list[list]:
+    # [business_id, similarity] pairs, best first
+    vector = post.embedding
+    if POST_VOTE_BLEND > 0:
+        result = await db.execute(
+            # without the result type the vector avg comes back as its text form
+            select(func.avg(Vote.embedding, type_=Vector(768)))
+            .where(
+                Vote.post_id == post.id,
+                Vote.embedding.isnot(None),
+                Vote.moderation_status == 'approved',
+            )
         )
-        .where(Verification.type.in_(['seen', 'used', 'coop']))
-        .group_by(Verification.business_id, Verification.type)
-    )
-    for bus_id, vtype, count in result.all():
-        if bus_id not in verif_stats:
-            verif_stats[bus_id] = {'seen': 0, 'used': 0, 'coop': 0}
-        verif_stats[bus_id][vtype] = count
-
-    scored = []
-    for item in ranked:
-        bus = item["bus"]
-        
-        if bus.user_id in already_connected:
-            continue
-            
-        stats = verif_stats.get(bus.id, {'seen': 0, 'used': 0, 'coop': 0})
-        verif_score = (stats['coop'] * 3) + (stats['used'] * 2) + stats['seen']
-        
-        community_boost = 1.3 if any(c.id == community_id for c in bus.communities) else 1
-        final_score = item["score"] * community_boost + verif_score * 0.1
-        
-        scored.append({
-            "bus": bus,
-            "score": final_score,
-            "verification_stats": stats,
-        })
-
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    top_n = scored[:n]
-
-    contacts = [
-        BusinessContact(
-            user_id=item["bus"].user_id,
-            username=item["bus"].user.username or "",
-            phone_number=item["bus"].user.phone_number or "",
-            business_name=item["bus"].name,
-            business_bio=item["bus"].bio or "",
-            cont_goal=item["bus"].cont_goal,
-            reaction_time=item["bus"].reaction_time,
-            verification_stats=item["verification_stats"],
+        centroid = result.scalar()
+        if centroid is not None:
+            post_vec, vote_vec = (np.asarray(v, dtype=np.float32) for v in (post.embedding, centroid))
+            if np.linalg.norm(vote_vec) > 0:
+                vector = (
+                    (1 - POST_VOTE_BLEND) * post_vec / np.linalg.norm(post_vec)
+                    + POST_VOTE_BLEND * vote_vec / np.linalg.norm(vote_vec)
+                ).tolist()
+
+    distance = Business.embedding.cosine_distance(vector)
+    stmt = (
+        select(Business.id, distance.label('distance'))
+        .where(
+            Business.embedding.isnot(None),
+            Business.user_id != post.user_id,
         )
-        for item in top_n
+        .order_by(distance)
+        .limit(n)
+    )
+    if community_only:
+        stmt = stmt.where(
+            Business.id.in_(
+                select(BusinessOperationsLink.business_id)
+                .where(BusinessOperationsLink.community_id == post.community_id)
+            )
+        )
+
+    await set_ef_search(db, n)
+    result = await db.execute(stmt)
+    return [[business_id, round(1 - float(d), 4)] for business_id, d in result.all()]
+
+
+async def fetch_post_businesses(
+    post_id: int,
+    n: int,
+    community_only: bool,
+    db: AsyncSession,
+) -> list[PostBusinessMatch]:
+    result = await db.execute(
+        select(Post)
+        .where(Post.id == post_id, Post.moderation_status == 'approved')
+    )
+    post = result.scalars().first()
+
+    if not post:
+        raise HTTPException(status_code=404, detail='Post not found')
+    if post.embedding is None:
+        return []
+
+    variant = f"{n}:{int(community_only)}"
+    matches = None
+    try:
+        matches = await valkey_client.get_post_businesses(post_id, variant)
+    except Exception as e:
+        logging.error(f"Could not read cached businesses for post {post_id}: {e}")
+
+    if matches is None:
+        matches = await rank_post_businesses(post, n, community_only, db)
+        try:
+            await valkey_client.set_post_businesses(post_id, variant, matches, POST_BUSINESSES_TTL)
+        except Exception as e:
+            logging.error(f"Could not cache businesses for post {post_id}: {e}")
+
+    if not matches:
+        return []
+
+    result = await db.execute(
+        select(Business)
+        .options(defer(Business.embedding))
+        .where(Business.id.in_([business_id for business_id, _ in matches]))
+    )
+    by_id = {bus.id: bus for bus in result.scalars().all()}
+
+    return [
+        PostBusinessMatch(
+            business_id=bus.id,
+            user_id=bus.user_id,
+            business_name=bus.name,
+            business_bio=bus.bio or "",
+            similarity=similarity,
+        )
+        for bus, similarity in ((by_id.get(business_id), similarity) for business_id, similarity in matches)
+        if bus is not None
     ]
-    
-    return contacts
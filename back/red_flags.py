@@ -1,5 +1,10 @@
 RED_FLAGS = ['nigga', 'bitch', 'cunt', 'c*nt', 'b*tch', 'n*gga', 'nigger']
 
+# language -> terms; asterisk and leetspeak variants are generated by flag_matcher
+RED_FLAG_LEXICON = {
+    'english': RED_FLAGS,
+}
+
 REDFLAG_LABELS = ['scam', 'direct_ads', 'insults']
 REDFLAG_TEXTS = (
     (REDFLAG_LABELS[0], 'Get-rich-quick scheme with guaranteed daily returns and no financial risk involved.'),
@@ -179,12 +179,42 @@ class BusinessContact(BaseModel):
     verification_stats: dict | None = None  # seen_count | used_count | coop_count
 
 
+class PostBusinessMatch(BaseModel):
+    business_id: int
+    user_id: int
+    business_name: str
+    business_bio: str
+    similarity: float
+
+
+class SimilarPost(BaseModel):
+    post_id: int
+    name: str
+    contents: str
+    community_id: int
+    created_at: datetime
+    duplicate_of: Optional[int] = None
+    similarity: float
+
+
 class GetContactsRequest(BaseModel):
     n: int
     community_id: int
     post_id: int
 
 
+class GetContactsPageRequest(BaseModel):
+    n: int
+    community_id: int
+    post_id: int
+    cursor: str | None = None # next_cursor of the previous page; None starts a new ranking
+
+
+class ContactsPage(BaseModel):
+    contacts: List[BusinessContact]
+    next_cursor: str | None = None
+
+
 class SearchPostRequest(BaseModel):
     query: str # no analogue for place_id since we want to look for posts in many communities
     n: int
@@ -208,8 +238,9 @@ class EditCommunityRequest(BaseModel):
 
 class ListCommunitiesRequest(BaseModel):
     n: int
-    offset: int
+    offset: int = 0
     sorting: str
+    cursor: Optional[str] = None  # X-Next-Cursor of the previous page; offset is ignored when set
 
 
 class SearchCommunitiesRequest(BaseModel):
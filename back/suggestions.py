@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from os import environ as env
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from postgres_conn import (
+    async_session, run_exclusive_periodic,
+    User, Business, ParticipantsLink, BusinessOperationsLink, Connection, ContactSuggestion,
+)
+from ranking import requester_vector, score_candidates, RANK_WEIGHTS
+
+
+SUGGESTIONS_TOP_K = int(env.get('SUGGESTIONS_TOP_K', 100))
+SUGGESTIONS_BLOCK = int(env.get('SUGGESTIONS_BLOCK', 256))  # requesters per matrix multiply
+SUGGESTIONS_HOUR = int(env.get('SUGGESTIONS_HOUR', 3))  # UTC
+SUGGESTIONS_LOCK = 7341002
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+async def load_business_matrix(db) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # same eligibility as live ranking: ids, owner ids, unit embeddings, verif_score
+    result = await db.execute(
+        select(Business.id, Business.user_id, Business.embedding, Business.verif_score)
+        .where(
+            Business.cont_goal.isnot(None),
+            Business.reaction_time.isnot(None),
+            Business.embedding.isnot(None),
+        )
+        .order_by(Business.id)
+    )
+    rows = result.all()
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    owners = np.array([r[1] for r in rows], dtype=np.int64)
+    matrix = _normalize_rows(np.array([r[2] for r in rows], dtype=np.float32).reshape(len(rows), -1))
+    verif = np.array([r[3] for r in rows], dtype=np.float32)
+    return ids, owners, matrix, verif
+
+
+async def load_requester_profiles(db) -> tuple[np.ndarray, np.ndarray]:
+    # active entrepreneurs and the same requester vector live ranking builds from their bios
+    result = await db.execute(
+        select(Business.user_id, Business.embedding)
+        .join(User, User.id == Business.user_id)
+        .where(
+            User.entrep.is_(True),
+            User.suspended.is_(False),
+            Business.embedding.isnot(None),
+        )
+        .order_by(Business.user_id)
+    )
+    by_user = defaultdict(list)
+    for user_id, embedding in result.all():
+        by_user[user_id].append(embedding)
+
+    profiles = {user_id: requester_vector(embs) for user_id, embs in by_user.items()}
+    profiles = {user_id: v for user_id, v in profiles.items() if v is not None}
+    user_ids = np.array(list(profiles), dtype=np.int64)
+    return user_ids, np.array(list(profiles.values()), dtype=np.float32).reshape(len(profiles), -1)
+
+
+def score_block(
+    ids: np.ndarray,
+    owners: np.ndarray,
+    matrix: np.ndarray,
+    verif: np.ndarray,
+    members: dict,
+    block_users: np.ndarray,
+    block_profiles: np.ndarray,
+    communities_of: dict,
+    connected: dict,
+    top_k: int,
+    computed_at: datetime,
+) -> list[dict]:
+    # contact_suggestions rows for one block of requesters, one per (requester, community)
+    keyword = np.zeros(len(ids), dtype=np.float32)
+    in_community = np.zeros(len(ids), dtype=np.float32)
+    # (block x businesses) cosine similarities in one multiply
+    sims = block_profiles @ matrix.T
+
+    rows = []
+    for row, user_id in enumerate(block_users.tolist()):
+        excluded = (owners == user_id) | np.isin(owners, connected.get(user_id, []))
+        for community_id in communities_of.get(user_id, []):
+            in_community[:] = 0
+            if community_id in members:
+                in_community[members[community_id]] = 1
+            top, _ = score_candidates(sims[row], keyword, in_community, verif, excluded, top_k, RANK_WEIGHTS)
+            rows.append({
+                'user_id': user_id,
+                'community_id': community_id,
+                'business_ids': ids[top].tolist(),
+                'computed_at': computed_at,
+            })
+    return rows
+
+
+async def compute_contact_suggestions(top_k: int = SUGGESTIONS_TOP_K, block: int = SUGGESTIONS_BLOCK) -> int:
+    async with async_session() as db:
+        ids, owners, matrix, verif = await load_business_matrix(db)
+        user_ids, profiles = await load_requester_profiles(db)
+        if not len(ids) or not len(user_ids):
+            logging.info("suggestions: nothing to compute")
+            return 0
+
+        index_of = {business_id: i for i, business_id in enumerate(ids.tolist())}
+        members = defaultdict(list)
+        result = await db.execute(select(BusinessOperationsLink.community_id, BusinessOperationsLink.business_id))
+        for community_id, business_id in result.all():
+            if business_id in index_of:
+                members[community_id].append(index_of[business_id])
+        members = {c: np.array(idx, dtype=np.intp) for c, idx in members.items()}
+
+        communities_of = defaultdict(list)
+        result = await db.execute(
+            select(ParticipantsLink.user_id, ParticipantsLink.community_id)
+            .where(ParticipantsLink.user_id.in_(user_ids.tolist()))
+        )
+        for user_id, community_id in result.all():
+            communities_of[user_id].append(community_id)
+
+        connected = defaultdict(list)
+        result = await db.execute(
+            select(Connection.requester_id, Connection.contact_id)
+            .where(Connection.requester_id.in_(user_ids.tolist()), Connection.contact_id.isnot(None))
+        )
+        for requester_id, contact_id in result.all():
+            connected[requester_id].append(contact_id)
+
+    computed_at = datetime.now(timezone.utc)
+    written = 0
+
+    for start in range(0, len(user_ids), block):
+        # the scoring is CPU-bound numpy work, so it runs off the event loop and requests keep being served
+        rows = await asyncio.to_thread(
+            score_block, ids, owners, matrix, verif, members,
+            user_ids[start:start + block], profiles[start:start + block],
+            communities_of, connected, top_k, computed_at,
+        )
+
+        if rows:
+            async with async_session() as db:
+                stmt = insert(ContactSuggestion).values(rows)
+                await db.execute(stmt.on_conflict_do_update(
+                    index_elements=['user_id', 'community_id'],
+                    set_={'business_ids': stmt.excluded.business_ids, 'computed_at': stmt.excluded.computed_at},
+                ))
+                await db.commit()
+            written += len(rows)
+
+    async with async_session() as db:
+        # pairs nobody belongs to any more
+        await db.execute(ContactSuggestion.__table__.delete().where(ContactSuggestion.computed_at < computed_at))
+        await db.commit()
+
+    logging.info(f"suggestions: {written} lists for {len(user_ids)} users over {len(ids)} businesses")
+    return written
+
+
+def seconds_until_next_run() -> float:
+    now = datetime.now(timezone.utc)
+    next_run = now.replace(hour=SUGGESTIONS_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_suggestions_scheduler():
+    await run_exclusive_periodic(SUGGESTIONS_LOCK, seconds_until_next_run, compute_contact_suggestions, 'Suggestions job')
+
+
+if __name__ == "__main__":
+    asyncio.run(compute_contact_suggestions())
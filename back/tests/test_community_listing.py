@@ -0,0 +1,48 @@
+import pytest
+
+import utils
+from postgres_conn import Community, ParticipantsLink
+
+
+@pytest.fixture
+async def communities(db, make_user, community, rank_hot):
+    # the fixture community plus four more, newest last, scored for the popular listing
+    creator = await make_user(username='founder')
+    more = [Community(name=f'Community {i}', description='local makers', creator_id=creator.id) for i in range(4)]
+    db.add_all(more)
+    await db.commit()
+    await rank_hot()
+    return [community, *more]
+
+
+async def walk(listing, db, statements, user_id=None, n=2) -> list[dict]:
+    # every page of a listing, checking each one is a single statement
+    items, cursor = [], None
+    while True:
+        statements.clear()
+        page, cursor = await listing(n, 0, db, user_id=user_id, cursor=cursor)
+        assert len(statements) == 1, statements
+        items.extend(page)
+        if cursor is None:
+            return items
+
+
+@pytest.mark.parametrize('listing', [utils.list_new_communities, utils.list_popular_communities])
+async def test_anonymous_listing_is_one_query_per_page(listing, db, communities, statements):
+    items = await walk(listing, db, statements)
+
+    assert sorted(item['id'] for item in items) == sorted(c.id for c in communities)
+    assert not any(item['joined'] for item in items)
+
+
+@pytest.mark.parametrize('listing', [utils.list_new_communities, utils.list_popular_communities])
+async def test_member_listing_is_one_query_per_page(listing, db, make_user, communities, statements):
+    member = await make_user(username='member')
+    joined = {communities[1].id, communities[3].id}
+    db.add_all([ParticipantsLink(user_id=member.id, community_id=community_id) for community_id in joined])
+    await db.commit()
+
+    items = await walk(listing, db, statements, user_id=member.id)
+
+    assert sorted(item['id'] for item in items) == sorted(c.id for c in communities)
+    assert {item['id'] for item in items if item['joined']} == joined
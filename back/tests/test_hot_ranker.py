@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import select
+
+import hot_ranker
+import utils
+from postgres_conn import Post, Vote, PostHotScore
+
+
+@pytest.fixture
+async def posts(db, make_user, community):
+    author = await make_user(username='author')
+    posts = [
+        Post(name=f'Post {i}', contents='looking for a supplier', community_id=community.id, user_id=author.id)
+        for i in range(5)
+    ]
+    db.add_all(posts)
+    await db.commit()
+    return posts
+
+
+async def vote(db, make_user, post, username):
+    voter = await make_user(username=username)
+    db.add(Vote(post_id=post.id, voter_id=voter.id, would_pay=20))
+    await db.commit()
+
+
+async def test_rerank_writes_only_changed_scores(db, make_user, posts, rank_hot):
+    first = await rank_hot()
+    assert (first['posts'], first['communities']) == (5, 1)
+
+    # nothing changed: nothing is rewritten, however much time has passed
+    assert await rank_hot() == {'posts': 0, 'unranked': 0, 'communities': 0}
+
+    await vote(db, make_user, posts[2], 'voter')
+    counts = await rank_hot()
+    assert (counts['posts'], counts['communities']) == (1, 1)
+
+    posts[4].moderation_status = 'rejected'
+    db.add(posts[4])
+    await db.commit()
+    assert (await rank_hot())['unranked'] == 1
+
+    result = await db.execute(select(PostHotScore.post_id))
+    assert set(result.scalars().all()) == {post.id for post in posts[:4]}
+
+
+async def test_cursor_survives_a_rerank(db, make_user, posts, rank_hot):
+    await vote(db, make_user, posts[1], 'voter')
+    await rank_hot()
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = await utils.fetch_popular_posts(2, 0, db, cursor)
+        seen.extend(preview.post_id for preview in page)
+        if cursor is None:
+            break
+        # the ranker running between two pages does not shift the rest of the feed
+        await rank_hot()
+
+    assert seen[0] == posts[1].id
+    assert sorted(seen) == sorted(post.id for post in posts)
+
+
+async def test_new_post_is_listed_before_the_next_run(db, make_user, posts, community, rank_hot):
+    await rank_hot()
+    author = await make_user(username='newcomer')
+    post = Post(name='Fresh', contents='just posted', community_id=community.id, user_id=author.id)
+    db.add(post)
+    await db.flush()
+    await hot_ranker.rank_new(db, [post.id], [community.id])
+    await db.commit()
+
+    page, _ = await utils.fetch_popular_posts(10, 0, db)
+    # newest, so ahead of the equally unvoted older posts
+    assert page[0].post_id == post.id
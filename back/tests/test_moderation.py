@@ -0,0 +1,50 @@
+import numpy as np
+from sqlalchemy import select
+
+import moderation
+from postgres_conn import Post, PostHotScore
+
+
+class NoRedFlags:
+    async def ensure_fresh(self):
+        pass
+
+    def match(self, vectors):
+        return [None] * len(vectors)
+
+
+async def test_repeats_in_one_batch_are_marked_duplicate(db, session_factory, make_user, community, monkeypatch):
+    async def embed(texts, lane='interactive'):
+        # every text lands on the same vector, as two near-identical posts would
+        vector = np.zeros(768, dtype=np.float32)
+        vector[0] = 1
+        return [vector.tolist() for _ in texts]
+
+    async def keep_cache(post_ids):
+        pass
+
+    monkeypatch.setattr(moderation, 'async_session', session_factory)
+    monkeypatch.setattr(moderation, 'get_embeddings', embed)
+    monkeypatch.setattr(moderation, 'redflag_matcher', NoRedFlags())
+    monkeypatch.setattr(moderation, 'invalidate_post_matches', keep_cache)
+
+    author = await make_user(username='author')
+    first, repeat = (
+        Post(name='Green beans', contents='looking for a green coffee importer',
+             community_id=community.id, user_id=author.id, moderation_status='pending')
+        for _ in range(2)
+    )
+    db.add_all([first, repeat])
+    await db.commit()
+
+    assert await moderation.moderate_batch('post') == 2
+
+    async with session_factory() as fresh:
+        result = await fresh.execute(select(Post.id, Post.moderation_status, Post.duplicate_of).order_by(Post.id))
+        assert result.all() == [
+            (first.id, 'approved', None),
+            (repeat.id, 'approved', first.id),
+        ]
+        # scored in the same transaction, so the popular feeds list them before the next hot_ranker run
+        result = await fresh.execute(select(PostHotScore.post_id))
+        assert set(result.scalars().all()) == {first.id, repeat.id}
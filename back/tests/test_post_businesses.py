@@ -0,0 +1,37 @@
+import numpy as np
+
+import ranking
+from postgres_conn import Business, Post, Vote
+
+
+def unit(*weights) -> list[float]:
+    vector = np.zeros(768, dtype=np.float32)
+    vector[:len(weights)] = weights
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+async def test_approved_votes_pull_post_matches(db, make_user, community, monkeypatch):
+    monkeypatch.setattr(ranking, 'POST_VOTE_BLEND', 0.6)
+    author = await make_user(username='author')
+    owner = await make_user(username='owner')
+
+    post = Post(name='Beans', contents='need green beans', community_id=community.id, user_id=author.id, embedding=unit(1))
+    # same topic as the post, and the one the voters describe
+    on_post = Business(name='Roastery', bio='roasting', user_id=owner.id, embedding=unit(1))
+    on_votes = Business(name='Importer', bio='green beans', user_id=owner.id, embedding=unit(0.6, 0.8))
+    db.add_all([post, on_post, on_votes])
+    await db.commit()
+
+    # no votes yet: the post's own vector decides
+    ranked = await ranking.rank_post_businesses(post, 2, False, db)
+    assert [business_id for business_id, _ in ranked] == [on_post.id, on_votes.id]
+
+    for i in range(3):
+        voter = await make_user(username=f'voter{i}')
+        db.add(Vote(post_id=post.id, voter_id=voter.id, would_pay=10, embedding=unit(0, 1)))
+    rejected = await make_user(username='rejected')
+    db.add(Vote(post_id=post.id, voter_id=rejected.id, embedding=unit(1), moderation_status='rejected'))
+    await db.commit()
+
+    ranked = await ranking.rank_post_businesses(post, 2, False, db)
+    assert [business_id for business_id, _ in ranked] == [on_votes.id, on_post.id]
@@ -0,0 +1,46 @@
+import pytest
+
+from text_index import analyze, stem, term_weights
+
+
+@pytest.mark.parametrize('singular, plural', [
+    ('coffee', 'coffees'),
+    ('cafe', 'cafes'),
+    ('service', 'services'),
+    ('shop', 'shops'),
+    ('box', 'boxes'),
+    ('tax', 'taxes'),
+    ('church', 'churches'),
+    ('dish', 'dishes'),
+    ('class', 'classes'),
+    ('address', 'addresses'),
+])
+def test_singular_and_plural_share_a_term(singular, plural):
+    assert stem(singular, 'english') == stem(plural, 'english')
+
+
+@pytest.mark.parametrize('token, term', [
+    ('coffees', 'coffee'),
+    ('cafes', 'cafe'),
+    ('boxes', 'box'),
+    ('classes', 'class'),
+    ('consulting', 'consult'),
+])
+def test_english_endings(token, term):
+    assert stem(token, 'english') == term
+
+
+def test_short_stems_are_kept_whole():
+    assert stem('uses', 'english') == 'use'
+    assert stem('bus', 'english') == 'bus'
+
+
+def test_analyze_drops_stop_words_and_long_tokens():
+    assert analyze('We roast the coffees for ' + 'x' * 80, 'english') == ['roast', 'coffee']
+
+
+def test_term_weights_are_normalized():
+    weights = term_weights('coffee coffees cafe', 'english')
+    assert set(weights) == {'coffee', 'cafe'}
+    assert weights['coffee'] > weights['cafe']
+    assert sum(w * w for w in weights.values()) == pytest.approx(1)
@@ -0,0 +1,101 @@
+import math
+import re
+from collections import Counter
+
+
+# Light per-language analysis for the business keyword index: tokenize, drop stop
+# words, strip the commonest inflectional endings. Index and query sides must
+# go through the same pipeline, so any change here needs a reindex (see
+# utils.backfill_business_terms).
+
+STOP_WORDS = {
+    'english': {
+        'a', 'about', 'after', 'all', 'also', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'been',
+        'but', 'by', 'can', 'could', 'do', 'does', 'for', 'from', 'get', 'had', 'has', 'have',
+        'he', 'her', 'his', 'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'just', 'like',
+        'me', 'more', 'most', 'my', 'no', 'not', 'of', 'on', 'one', 'only', 'or', 'other', 'our',
+        'out', 'over', 'she', 'so', 'some', 'such', 'than', 'that', 'the', 'their', 'them',
+        'then', 'there', 'these', 'they', 'this', 'to', 'up', 'us', 'very', 'was', 'we', 'were',
+        'what', 'when', 'which', 'who', 'will', 'with', 'would', 'you', 'your',
+    },
+    'russian': {
+        'а', 'без', 'более', 'бы', 'был', 'была', 'были', 'было', 'быть', 'в', 'вам', 'вас',
+        'весь', 'во', 'вот', 'все', 'всех', 'вы', 'где', 'да', 'для', 'до', 'его', 'ее', 'если',
+        'есть', 'еще', 'же', 'за', 'здесь', 'и', 'из', 'или', 'им', 'их', 'к', 'как', 'когда',
+        'кто', 'ли', 'либо', 'мне', 'мы', 'на', 'над', 'не', 'него', 'нет', 'ни', 'но', 'ну',
+        'о', 'об', 'он', 'она', 'они', 'оно', 'от', 'по', 'под', 'при', 'с', 'со', 'так',
+        'также', 'такой', 'там', 'то', 'того', 'только', 'том', 'ты', 'у', 'уже', 'что',
+        'чтобы', 'это', 'этот', 'я',
+    },
+    'dutch': {
+        'aan', 'al', 'alles', 'als', 'bij', 'dan', 'dat', 'de', 'die', 'dit', 'door', 'een',
+        'en', 'er', 'geen', 'had', 'heb', 'hebben', 'heeft', 'het', 'hij', 'hoe', 'ik', 'in',
+        'is', 'je', 'kan', 'maar', 'me', 'met', 'mij', 'na', 'naar', 'niet', 'nog', 'nu', 'of',
+        'om', 'ons', 'onze', 'ook', 'op', 'over', 'te', 'tot', 'u', 'uit', 'van', 'veel', 'voor',
+        'was', 'wat', 'we', 'wel', 'wij', 'wordt', 'zal', 'ze', 'zich', 'zij', 'zijn', 'zo',
+    },
+}
+
+# longest first; an ending is stripped only if at least MIN_STEM characters remain
+SUFFIXES = {
+    'english': (
+        'ational', 'ations', 'ation', 'ments', 'ment', 'nesses', 'ness', 'ings', 'ing',
+        'ities', 'ity', 'ers', 'er', 'ies', 'ied', 'ed', 'es', 'ly', 's',
+    ),
+    'russian': (
+        'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'ий', 'ый',
+        'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ов', 'ев', 'ам', 'ям', 'ах', 'ях', 'ом',
+        'ем', 'ых', 'их', 'ым', 'им', 'ию', 'ия', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+    ),
+    'dutch': (
+        'heden', 'heid', 'ingen', 'ing', 'lijk', 'ende', 'end', 'en', 'er', 'st', 'e', 's',
+    ),
+}
+
+# ending -> test on what would remain once it is stripped; endings without one are stripped unconditionally.
+# Together they map the usual singular/plural pairs onto one term: box/boxes, coffee/coffees, class/classes
+SUFFIX_RULES = {
+    'english': {
+        'es': lambda rest: rest.endswith(('s', 'x', 'z', 'ch', 'sh')),
+        's': lambda rest: not rest.endswith('s'),
+    },
+}
+
+MIN_TOKEN = 3
+MIN_STEM = 3
+MAX_TERM = 64  # business_terms.term is String(64); longer tokens are URLs and noise, not words
+
+_TOKEN_RE = re.compile(r'[^\W\d_]+')
+
+
+def stem(token: str, language: str) -> str:
+    rules = SUFFIX_RULES.get(language, {})
+    for suffix in SUFFIXES.get(language, ()):
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            rest = token[:-len(suffix)]
+            if suffix in rules and not rules[suffix](rest):
+                continue
+            return rest
+    return token
+
+
+def analyze(text: str, language: str = 'english') -> list[str]:
+    stop_words = STOP_WORDS.get(language, STOP_WORDS['english'])
+    return [
+        stem(token, language)
+        for token in _TOKEN_RE.findall((text or '').lower())
+        if MIN_TOKEN <= len(token) <= MAX_TERM and token not in stop_words
+    ]
+
+
+def term_weights(text: str, language: str = 'english') -> dict[str, float]:
+    # sublinear tf, L2-normalized so long bios do not win on length alone;
+    # idf is applied at query time because it moves as businesses are added
+    counts = Counter(analyze(text, language))
+    weights = {term: 1 + math.log(count) for term, count in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {term: w / norm for term, w in weights.items()} if norm else {}
+
+
+def idf(df: int, n_docs: int) -> float:
+    return math.log((1 + n_docs) / (1 + df)) + 1
@@ -1,8 +1,8 @@
 from fastapi import HTTPException, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_, delete, event
-from sqlalchemy import select, func, update, desc, asc
-from sqlalchemy.orm import selectinload, defer, Session
+from sqlalchemy import and_, delete, event, insert, literal
+from sqlalchemy import select, func, update, desc, asc, text
+from sqlalchemy.orm import selectinload, defer, Session, aliased
 from typing import List
 from langdetect import detect
 import numpy as np
@@ -15,9 +15,9 @@ import asyncio
 
 from fastapi import HTTPException, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_, delete, event
-from sqlalchemy import select, func, update, desc, asc
-from sqlalchemy.orm import selectinload, defer, Session
+from sqlalchemy import and_, delete, event, insert, literal
+from sqlalchemy import select, func, update, desc, asc, text
+from sqlalchemy.orm import selectinload, defer, Session, aliased
 from typing import List
 from langdetect import detect
 import numpy as np
@@ -28,10 +28,21 @@ from postgres_conn import *
 from minio_conn import *
 from vecutils import sentiment_check, get_embeddings
 from auth import hash_password
-from red_flags import RED_FLAGS
+from red_flags import RED_FLAG_LEXICON
+from text_index import term_weights
+from cursors import seek, keyset_cursor
+from hot_ranker import rank_new
+from valkey_conn import valkey_client
+from flag_matcher import build_flag_matcher
 
 API_BASE = os.getenv('API_BASE', 'https://serveyourcommunity.ftp.sh/api')
 
+# posts, votes and communities are saved as 'pending' and approved by moderation.py in the background
+ASYNC_MODERATION = os.getenv('ASYNC_MODERATION', 'false').lower() in ('1', 'true', 'yes')
+
+# cosine similarity above which a new post is treated as a repeat of an earlier one in its community
+DUPLICATE_POST_THRESHOLD = float(os.getenv('DUPLICATE_POST_THRESHOLD', 0.92))
+
 
 LANG_MAP = {
     "en": "english",
@@ -39,25 +50,10 @@ LANG_MAP = {
     "nl": "dutch",
 }
 
-_ESCAPED_FLAGS = [re.escape(flag.lower()) for flag in RED_FLAGS]
-_RED_FLAGS_REGEX = re.compile('|'.join(_ESCAPED_FLAGS))
+_RED_FLAGS_MATCHER = build_flag_matcher(RED_FLAG_LEXICON)
 
 def red_flags_check(message: str) -> bool:
-    message_lower = message.lower()
-    matches = _RED_FLAGS_REGEX.finditer(message_lower)
-    found = []
-    seen = set()
-    for match in matches:
-        matched_text = match.group(0)
-        # Находим оригинальный флаг по совпадению
-        original = next(flag for flag in RED_FLAGS if flag.lower() == matched_text)
-        if original not in seen:
-            found.append(original)
-            seen.add(original)
-    
-    if not found:
-        return True
-    return False
+    return not _RED_FLAGS_MATCHER.find(message)
 
 
 async def moderate(db: AsyncSession, *args):
@@ -65,11 +61,7 @@ async def moderate(db: AsyncSession, *args):
         if not red_flags_check(' '.join(args)):
             raise HTTPException(status_code=403, detail='Moderation not passed')
         
-        async for mod_db in get_db():
-            try:
-                sentiment = await sentiment_check(mod_db, args)
-            finally:
-                await mod_db.close()
+        sentiment = await sentiment_check(args)
         
         if not sentiment:
             raise HTTPException(status_code=403, detail='Moderation not passed')
@@ -112,6 +104,7 @@ async def create_community(req: CreateCommunityRequest, user_id: int, db: AsyncS
             creator_id   = user_id         ,
             mods         = [mod]           ,
             participants = [user]          ,
+            moderation_status = 'pending' if ASYNC_MODERATION else 'approved',
         )
         
         db.add(community)
@@ -119,6 +112,8 @@ async def create_community(req: CreateCommunityRequest, user_id: int, db: AsyncS
         await db.flush()
 
         mod.moderates = community
+        if community.moderation_status == 'approved':
+            await rank_new(db, community_ids=[community.id])
 
         return community
 
@@ -170,9 +165,15 @@ async def create_business(req: CreateBusinessRequest, user_id: int, db: AsyncSes
             cont_goal     = req.cont_goal     ,
             reaction_time = req.reaction_time ,
             embedding     = embedding[0]      ,
+            language      = detect_language(req.name, req.bio),
         )
 
         db.add(business)
+        await db.flush()
+
+        await index_business_terms(business, db)
+        after_commit(db, invalidate_contacts, user_id)
+        after_commit(db, drop_contact_suggestions, user_id)
         return business
         
     except HTTPException:
@@ -182,6 +183,95 @@ async def create_business(req: CreateBusinessRequest, user_id: int, db: AsyncSes
         raise HTTPException(status_code=500, detail=f'Failed to create business: {e}')
 
 
+_after_commit_tasks = set()
+
+
+def _run_after_commit(session):
+    for fn, args in session.info.pop('after_commit', []):
+        task = asyncio.get_running_loop().create_task(fn(*args))
+        _after_commit_tasks.add(task)
+        task.add_done_callback(_after_commit_tasks.discard)
+
+
+def after_commit(db: AsyncSession, fn, *args):
+    # runs fn(*args) once db commits: a cache dropped before the commit can be refilled
+    # from the old rows by a concurrent request and then lives for its whole TTL
+    pending = db.info.setdefault('after_commit', [])
+    if not pending:
+        event.listen(db.sync_session, 'after_commit', _run_after_commit, once=True)
+    pending.append((fn, args))
+
+
+async def invalidate_contacts(requester_id: int | None = None, business_ids: List[int] = ()):
+    # drops cached contact rankings (see ranking.fetch_useful_businessmen); they expire anyway
+    try:
+        await valkey_client.invalidate_contact_rankings(requester_id, list(business_ids))
+    except Exception as e:
+        logging.error(f'Could not invalidate cached contacts: {e}')
+
+
+async def drop_contact_suggestions(requester_id: int):
+    # the nightly suggestions were ranked for the requester's old businesses; live ranking takes over until the next batch
+    try:
+        async with async_session() as db:
+            await db.execute(delete(ContactSuggestion).where(ContactSuggestion.user_id == requester_id))
+            await db.commit()
+    except Exception as e:
+        logging.error(f'Could not drop contact suggestions for user {requester_id}: {e}')
+
+
+async def invalidate_post_matches(post_ids: List[int]):
+    # drops cached post -> businesses matches (see ranking.fetch_post_businesses)
+    try:
+        await valkey_client.invalidate_post_businesses(post_ids)
+    except Exception as e:
+        logging.error(f'Could not invalidate cached post matches: {e}')
+
+
+async def index_business_terms(business: Business, db: AsyncSession):
+    await db.execute(delete(BusinessTerm).where(BusinessTerm.business_id == business.id))
+
+    weights = term_weights(business.bio, business.language)
+    if weights:
+        await db.execute(
+            insert(BusinessTerm),
+            [{'term': term, 'business_id': business.id, 'weight': w} for term, w in weights.items()],
+        )
+
+
+async def backfill_business_terms(batch: int = 500):
+    # businesses created before the keyword index existed
+    last_id = 0
+    while True:
+        try:
+            async with async_session() as db:
+                result = await db.execute(
+                    select(Business)
+                    .where(
+                        Business.id > last_id,
+                        ~select(BusinessTerm.business_id).where(BusinessTerm.business_id == Business.id).exists(),
+                    )
+                    .options(defer(Business.embedding))
+                    .order_by(Business.id)
+                    .limit(batch)
+                )
+                businesses = result.scalars().all()
+                if not businesses:
+                    return
+
+                for business in businesses:
+                    business.language = detect_language(business.name, business.bio)
+                    await index_business_terms(business, db)
+                await db.commit()
+
+            last_id = businesses[-1].id
+            logging.info(f"Indexed terms for {len(businesses)} businesses")
+
+        except Exception as e:
+            logging.error(f"Could not backfill business terms: {e}")
+            return
+
+
 async def delete_business(business_id: int, user_id: int, db: AsyncSession):
     try:
         result = await db.execute(select(Business).where(
@@ -194,6 +284,8 @@ async def delete_business(business_id: int, user_id: int, db: AsyncSession):
             raise HTTPException(status_code=404, detail=f'Business not found')
 
         await db.delete(business)
+        after_commit(db, invalidate_contacts, user_id, [business_id])
+        after_commit(db, drop_contact_suggestions, user_id)
         
     except HTTPException:
         raise
@@ -218,6 +310,8 @@ async def edit_business(req: EditBusinessRequest, user_id: int, business_id: int
 
         if req.bio is not None:
             business.bio = req.bio 
+            business.language = detect_language(business.name, business.bio)
+            await index_business_terms(business, db)
 
         if req.community_ids:
             communities = []
@@ -231,6 +325,9 @@ async def edit_business(req: EditBusinessRequest, user_id: int, business_id: int
         text_for_embedding = f"{business.name} {business.bio}"
         embedding = await get_embeddings([text_for_embedding])
         business.embedding = embedding[0]
+
+        after_commit(db, invalidate_contacts, user_id, [business_id])
+        after_commit(db, drop_contact_suggestions, user_id)
         
     except HTTPException:
         raise
@@ -249,7 +346,6 @@ async def get_business(business_id: int, user_id: int, db: AsyncSession):
             )
             .options(
                 selectinload(Business.communities),
-                selectinload(Business.verifications),
                 defer(Business.embedding),
             )
         )
@@ -266,6 +362,11 @@ async def get_business(business_id: int, user_id: int, db: AsyncSession):
         raise HTTPException(status_code=500, detail=f'Could not get business: {e}')
 
 
+def verification_counts(business: Business) -> dict:
+    counts = {'seen': business.verif_seen, 'use': business.verif_used, 'coop': business.verif_coop}
+    return {vtype: count for vtype, count in counts.items() if count}
+
+
 async def get_user_communities_ids(user_id: int, db: AsyncSession):
     try:
         result = await db.execute(
@@ -289,7 +390,6 @@ async def get_newcomers_overall(n: int, db: AsyncSession):
             select(Business)
             .options(
                 selectinload(Business.communities),
-                selectinload(Business.verifications),
             )
             .order_by(desc(Business.created_at))
             .limit(n)
@@ -320,7 +420,6 @@ async def get_newcomers(n: int, communities_ids: List[int], db: AsyncSession):
             .where(Business.id.in_(business_ids))
             .options(
                 selectinload(Business.communities),
-                selectinload(Business.verifications),
             )
             .order_by(desc(Business.created_at))
             .limit(n)
@@ -360,6 +459,18 @@ async def verify_business(
 
         db.add(verification)
 
+        column = VERIFICATION_COLUMNS.get(req.type)
+        if column:
+            await db.execute(
+                update(Business)
+                .where(Business.id == req.business_id)
+                .values({
+                    column: getattr(Business, column) + 1,
+                    'verif_score': Business.verif_score + VERIFICATION_WEIGHTS[column],
+                })
+            )
+            after_commit(db, invalidate_contacts, None, [req.business_id])
+
     except HTTPException:
         raise
     except Exception as e:
@@ -367,6 +478,99 @@ async def verify_business(
         raise HTTPException(status_code=500, detail=f'Could not put verification on business: {e}')
 
 
+async def similar_posts(
+    embedding: List[float],
+    community_id: int | None,
+    n: int,
+    db: AsyncSession,
+    exclude_id: int | None = None,
+    canonical_only: bool = False,
+    before_id: int | None = None,
+) -> List[tuple]:
+    # (post, similarity) pairs from the posts HNSW index, best first
+    distance = Post.embedding.cosine_distance(embedding)
+    stmt = (
+        select(Post, distance.label('distance'))
+        .options(defer(Post.embedding))
+        .where(
+            Post.embedding.isnot(None),
+            Post.moderation_status == 'approved',
+        )
+        .order_by(distance)
+        .limit(n)
+    )
+    if community_id:
+        stmt = stmt.where(Post.community_id == community_id)
+    if exclude_id:
+        stmt = stmt.where(Post.id != exclude_id)
+    if canonical_only:
+        stmt = stmt.where(Post.duplicate_of.is_(None))
+    if before_id:
+        stmt = stmt.where(Post.id < before_id)
+
+    await set_ef_search(db, n)
+    result = await db.execute(stmt)
+    return [(post, round(1 - float(d), 4)) for post, d in result.all()]
+
+
+async def mark_duplicate_post(post: Post, db: AsyncSession) -> int | None:
+    # points a freshly embedded post at an earlier near-identical one and moves its votes there
+    if post.embedding is None:
+        return None
+
+    # only earlier posts: two repeats approved together must not end up pointing at each other
+    matches = await similar_posts(post.embedding, post.community_id, 1, db, canonical_only=True, before_id=post.id)
+    if not matches or matches[0][1] < DUPLICATE_POST_THRESHOLD:
+        return None
+
+    canonical_id = matches[0][0].id
+    post.duplicate_of = canonical_id
+    await db.execute(
+        update(Vote)
+        .where(
+            Vote.post_id == post.id,
+            Vote.voter_id.not_in(select(Vote.voter_id).where(Vote.post_id == canonical_id)),
+        )
+        .values(post_id=canonical_id)
+    )
+    return canonical_id
+
+
+async def fetch_similar_posts(post_id: int, n: int, community_only: bool, db: AsyncSession) -> List[SimilarPost]:
+    try:
+        result = await db.execute(
+            select(Post.embedding, Post.community_id)
+            .where(Post.id == post_id, Post.moderation_status == 'approved')
+        )
+        row = result.first()
+
+        if not row:
+            raise HTTPException(status_code=404, detail='Post not found')
+        embedding, community_id = row
+        if embedding is None:
+            return []
+
+        matches = await similar_posts(embedding, community_id if community_only else None, n, db, exclude_id=post_id)
+
+        return [
+            SimilarPost(
+                post_id=post.id,
+                name=post.name,
+                contents=post.contents,
+                community_id=post.community_id,
+                created_at=post.created_at,
+                duplicate_of=post.duplicate_of,
+                similarity=similarity,
+            )
+            for post, similarity in matches
+        ]
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'Could not fetch similar posts: {e}')
+
+
 async def create_post(req: CreatePostRequest, user_id: int, db: AsyncSession):
     try:
         result = await db.execute(
@@ -377,8 +581,10 @@ async def create_post(req: CreatePostRequest, user_id: int, db: AsyncSession):
         if not community:
             raise HTTPException(status_code=404, detail='Community not found')
         
-        text_for_embedding = f"{req.name} {req.contents}"
-        embedding = await get_embeddings([text_for_embedding])
+        embedding = None
+        if not ASYNC_MODERATION:
+            text_for_embedding = f"{req.name} {req.contents}"
+            embedding = (await get_embeddings([text_for_embedding]))[0]
         
         post = Post(
             name         = req.name         ,
@@ -386,7 +592,8 @@ async def create_post(req: CreatePostRequest, user_id: int, db: AsyncSession):
             community_id = req.community_id ,
             user_id      = user_id          ,
             language     = detect_language(req.name, req.contents),
-            embedding    = embedding[0],
+            embedding    = embedding,
+            moderation_status = 'pending' if ASYNC_MODERATION else 'approved',
         )
         db.add(post)
         await db.flush()
@@ -398,6 +605,13 @@ async def create_post(req: CreatePostRequest, user_id: int, db: AsyncSession):
 
         db.add(vote)
 
+        if not ASYNC_MODERATION:
+            await db.flush()
+            canonical_id = await mark_duplicate_post(post, db)
+            if canonical_id:
+                after_commit(db, invalidate_post_matches, [canonical_id])
+            await rank_new(db, [post.id], [post.community_id])
+
         return post
 
     except HTTPException:
@@ -423,11 +637,12 @@ async def get_post(post_id: int, db: AsyncSession):
         if not post:
             raise HTTPException(status_code=404, detail='Post not found')
 
-        would = [v.would_pay for v in post.votes if v.would_pay is not None]
+        votes = [v for v in post.votes if v.moderation_status == 'approved']
+        would = [v.would_pay for v in votes if v.would_pay is not None]
         stats = None
         if would:      
             stats = {
-                'amount': len(post.votes),
+                'amount': len(votes),
                 'mean': round(float(np.mean(would)), 2),
                 'median': round(float(np.median(would)), 2),
                 'min': min(would),
@@ -435,7 +650,7 @@ async def get_post(post_id: int, db: AsyncSession):
             }
 
         votes_data = []
-        for v in post.votes:
+        for v in votes:
             vote_dict = {}
             if v.competition is not None:
                 vote_dict['competition'] = v.competition
@@ -451,6 +666,7 @@ async def get_post(post_id: int, db: AsyncSession):
                 'contents': post.contents,
                 'created_at': post.created_at,
                 'community_id': post.community_id,
+                'duplicate_of': post.duplicate_of,
                 'image_url': f"{API_BASE}/post/image/{post.id}" if post.image else None,
             },
             'stats': stats,
@@ -476,6 +692,7 @@ async def delete_post(post_id: int, db: AsyncSession):
             raise HTTPException(status_code=404, detail='Post not found')
 
         await db.delete(post)
+        after_commit(db, invalidate_post_matches, [post_id])
         
     except HTTPException:
         raise
@@ -497,9 +714,16 @@ async def edit_post(req: EditPostRequest, db: AsyncSession):
 
         post.contents = req.contents
 
-        text_for_embedding = f"{post.name} {post.contents}"
-        embedding = await get_embeddings([text_for_embedding])
-        post.embedding = embedding[0]
+        if ASYNC_MODERATION:
+            # re-embedded by the moderation worker; a claim on the old text no longer applies
+            post.moderation_status = 'pending'
+            post.moderation_claimed_at = None
+        else:
+            text_for_embedding = f"{post.name} {post.contents}"
+            embedding = await get_embeddings([text_for_embedding])
+            post.embedding = embedding[0]
+
+        after_commit(db, invalidate_post_matches, [post.id])
 
     except HTTPException:
         raise
@@ -534,18 +758,26 @@ async def vote_on_post(req: VoteOnPostRequest, user_id: int, db: AsyncSession):
         if req.problems:
             text_parts.append(req.problems)
         text_for_embedding = " ".join(text_parts)
-        embedding = await get_embeddings([text_for_embedding])
+        embedding = None
+        if not ASYNC_MODERATION:
+            embedding = (await get_embeddings([text_for_embedding], lane='bulk'))[0]
+
+        # votes on a duplicate are counted on the post it repeats
+        post_id = post.duplicate_of or post.id
 
         vote = Vote(
-            post_id   = req.post_id       ,
+            post_id   = post_id           ,
             would_pay = req.would_pay     ,
             voter_id  = user_id           ,
             competition = req.competition ,
             problems = req.problems       ,
-            embedding = embedding[0]       ,
+            embedding = embedding          ,
+            moderation_status = 'pending' if ASYNC_MODERATION else 'approved',
         )
 
         db.add(vote)
+        if not ASYNC_MODERATION:
+            after_commit(db, invalidate_post_matches, [post_id])
         
     except HTTPException:
         raise
@@ -554,99 +786,100 @@ async def vote_on_post(req: VoteOnPostRequest, user_id: int, db: AsyncSession):
         raise HTTPException(status_code=500, detail=f'Could not vote on post: {e}')
 
 
-async def fetch_popular_posts(n: int, offset: int, db: AsyncSession) -> List[PostPreview]:
+async def fetch_popular_posts(
+    n: int,
+    offset: int,
+    db: AsyncSession,
+    cursor: str | None = None,
+) -> tuple[List[PostPreview], str | None]:
     try:
-        result = await db.execute(
-            select(Post)
-            .outerjoin(Post.votes)
+        # posts are listed once hot_ranker.py has scored them; see there for why the cursor stays valid
+        stmt = (
+            select(Post, PostHotScore.hot_score)
+            .join(PostHotScore, PostHotScore.post_id == Post.id)
             .options(
-                selectinload(Post.votes),
                 selectinload(Post.community),
                 defer(Post.embedding),
             )
-            .group_by(Post.id)
-            .order_by(func.count(Vote.id).desc())
-            .offset(offset)
+            .where(Post.moderation_status == 'approved')
+            .order_by(PostHotScore.hot_score.desc(), PostHotScore.post_id.desc())
             .limit(n)
-        )        
-        posts = result.scalars().all()
+        )
+        # offset stays for clients that have not moved to cursors yet
+        stmt = seek(stmt, [PostHotScore.hot_score, PostHotScore.post_id], cursor) if cursor else stmt.offset(offset)
+        result = await db.execute(stmt)
+        rows = result.all()
+        posts = [post for post, _ in rows]
 
-        if not posts:
+        if not posts and not cursor:
             raise HTTPException(status_code=404, detail='No posts found')
 
         previews = []
         for post in posts:
-            votes = [v.would_pay for v in post.votes if v.would_pay is not None]
-            med = float(np.median(votes)) if votes else 0.0
             preview = PostPreview(
-                post_id        = post.id             ,
-                name           = post.name           ,
-                contents       = post.contents[:50]  ,
-                n_votes        = len(votes)          ,
-                median         = med                 ,
-                created_at     = post.created_at     ,
-                community_name = post.community.name ,
-                community_id   = post.community_id   ,
+                post_id        = post.id                      ,
+                name           = post.name                    ,
+                contents       = post.contents[:50]           ,
+                n_votes        = post.vote_count              ,
+                median         = post.would_pay_median or 0.0 ,
+                created_at     = post.created_at              ,
+                community_name = post.community.name          ,
+                community_id   = post.community_id            ,
                 image_url = f"{API_BASE}/post/image/{post.id}" if getattr(post, 'image', False) else None,
             )
             previews.append(preview)
-        
-        return previews                    
+
+        next_cursor = keyset_cursor([rows[-1].hot_score, posts[-1].id]) if posts and len(posts) == n else None
+        return previews, next_cursor
+
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Could not fetch popular posts: {e}')
-    
 
-async def fetch_n_posts_for_user(user_id: int, n: int, offset: int, db: AsyncSession) -> List[PostPreview]:
+
+async def fetch_n_posts_for_user(
+    user_id: int,
+    n: int,
+    offset: int,
+    db: AsyncSession,
+    cursor: str | None = None,
+) -> tuple[List[PostPreview], str | None]:
     try:
-        result = await db.execute(
-            select(Post)
-            .join(ParticipantsLink, ParticipantsLink.community_id == Post.community_id)
-            .outerjoin(Post.votes)
+        stmt = (
+            select(Post, PostHotScore.hot_score)
+            .join(PostHotScore, PostHotScore.post_id == Post.id)
+            .join(ParticipantsLink, ParticipantsLink.community_id == PostHotScore.community_id)
             .options(
-                selectinload(Post.votes).load_only(Vote.would_pay),
                 selectinload(Post.community),
                 defer(Post.embedding),
             )
-            .where(ParticipantsLink.user_id == user_id)
-            .offset(offset)
-            .limit(n * 3)
+            .where(ParticipantsLink.user_id == user_id, Post.moderation_status == 'approved')
+            .order_by(PostHotScore.hot_score.desc(), PostHotScore.post_id.desc())
+            .limit(n)
         )
-        
-        posts = result.scalars().all()
-        
-        posts_data = []
-        for post in posts:
-            votes = [v.would_pay for v in post.votes if v.would_pay is not None]
-            posts_data.append({
-                'post': post,
-                'vote_count': len(votes),
-                'votes': votes
-            })
-        
-        posts_data.sort(key=lambda x: x['vote_count'], reverse=True)
-        posts_data = posts_data[:n]
+        stmt = seek(stmt, [PostHotScore.hot_score, PostHotScore.post_id], cursor) if cursor else stmt.offset(offset)
+        result = await db.execute(stmt)
+        rows = result.all()
+        posts = [post for post, _ in rows]
         
         previews = []
-        for data in posts_data:
-            post = data['post']
-            votes = data['votes']
-            med = float(np.median(votes)) if votes else 0.0
+        for post in posts:
             preview = PostPreview(
-                post_id        = post.id             ,
-                name           = post.name           ,
-                contents       = post.contents[:50]  ,
-                n_votes        = data['vote_count']          ,
-                median         = med                 ,
-                created_at     = post.created_at     ,
-                community_name = post.community.name ,
-                community_id   = post.community_id   ,
+                post_id        = post.id                      ,
+                name           = post.name                    ,
+                contents       = post.contents[:50]           ,
+                n_votes        = post.vote_count              ,
+                median         = post.would_pay_median or 0.0 ,
+                created_at     = post.created_at              ,
+                community_name = post.community.name          ,
+                community_id   = post.community_id            ,
                 image_url = f"{API_BASE}/post/image/{post.id}" if getattr(post, 'image', False) else None,
             )
             previews.append(preview)
 
-        return previews
+        next_cursor = keyset_cursor([rows[-1].hot_score, posts[-1].id]) if posts and len(posts) == n else None
+        return previews, next_cursor
 
     except HTTPException:
         raise
@@ -663,9 +896,6 @@ async def search_posts(query: str, n: int, db: AsyncSession) -> List[Post]:
         language = detect_language(query, '')  # Фикс аргумента
         ts_query = func.plainto_tsquery(language, query)
     
-        vote_subq = select(Vote.post_id, func.count(Vote.id).label('n_votes')) \
-            .group_by(Vote.post_id).subquery()
-    
         stmt = select(
             Post.id, 
             Post.name, 
@@ -673,17 +903,11 @@ async def search_posts(query: str, n: int, db: AsyncSession) -> List[Post]:
             Post.community_id,
             Post.contents,
             Community.name.label('community_name'),
-            vote_subq.c.n_votes,
-            func.percentile_cont(0.5).within_group(Vote.would_pay).label('median')
+            Post.vote_count,
+            Post.would_pay_median,
         ).select_from(Post) \
          .join(Community, Post.community_id == Community.id) \
-         .outerjoin(vote_subq, Post.id == vote_subq.c.post_id) \
-         .outerjoin(Vote, Post.id == Vote.post_id) \
-         .where(Post.search_vector.op('@@')(ts_query)) \
-         .group_by(
-             Post.id, Post.name, Post.created_at, Post.community_id, 
-             Community.name, vote_subq.c.n_votes
-         ) \
+         .where(Post.search_vector.op('@@')(ts_query), Post.moderation_status == 'approved') \
          .order_by(func.ts_rank_cd(Post.search_vector, ts_query).desc()) \
          .limit(n)        
         result = await db.execute(stmt)
@@ -695,9 +919,9 @@ async def search_posts(query: str, n: int, db: AsyncSession) -> List[Post]:
                 name=row[1],
                 created_at=row[2], 
                 community_id=row[3],
-                community_name=row[4] or "Unknown",
-                contents=row[5],
-                n_votes=row[6] or 0,
+                community_name=row[5] or "Unknown",
+                contents=row[4],
+                n_votes=row[6],
                 median=float(row[7]) if row[7] else 0.0,
             )
             for row in rows
@@ -723,6 +947,9 @@ async def connect(requester_id: int, contact_ids: list[int], db: AsyncSession):
 
         for cid in new_contact_ids:
             db.add(Connection(requester_id=requester_id, contact_id=cid))
+
+        if new_contact_ids:
+            after_commit(db, invalidate_contacts, requester_id)
         
     except HTTPException:
         raise
@@ -789,6 +1016,9 @@ async def edit_community(req: EditCommunityRequest, db: AsyncSession, user_id: i
             raise HTTPException(status_code=401, detail='Forbidden')
         
         community.description = req.description
+        if ASYNC_MODERATION:
+            community.moderation_status = 'pending'
+            community.moderation_claimed_at = None
         
         await db.flush()
         await db.ferfesh(community)
@@ -835,106 +1065,91 @@ async def change_moderators(req: ChangeModeratorsRequest, db: AsyncSession, user
         raise HTTPException(status_code=500, detail=f'Could not edit community: {e}')
 
 
-async def list_new_communities(n: int, offset: int, db: AsyncSession, user_id: int | None = None):
+def community_listing(user_id: int | None = None):
+    # id, name, description, participant_count, post_count, joined, then created_at as a sort key
+    if not user_id:
+        return select(
+            Community.id, Community.name, Community.description,
+            Community.participant_count, Community.post_count, literal(False), Community.created_at,
+        ).where(Community.moderation_status == 'approved')
+
+    mine = aliased(ParticipantsLink)
+    return (
+        select(
+            Community.id, Community.name, Community.description,
+            Community.participant_count, Community.post_count, mine.user_id.isnot(None), Community.created_at,
+        )
+        .outerjoin(mine, and_(mine.community_id == Community.id, mine.user_id == user_id))
+        .where(Community.moderation_status == 'approved')
+    )
+
+
+def community_dicts(rows) -> list[dict]:
+    return [
+        {
+            'id': id,
+            'name': name,
+            'description': description,
+            'participant_count': participant_count,
+            'post_count': post_count,
+            'joined': joined,
+        }
+        for id, name, description, participant_count, post_count, joined, *_ in rows
+    ]
+
+
+async def list_new_communities(
+    n: int,
+    offset: int,
+    db: AsyncSession,
+    user_id: int | None = None,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
     try:
-        result = await db.execute(
-            select(Community)
-            .order_by(Community.created_at.desc())
+        stmt = (
+            community_listing(user_id)
+            .order_by(Community.created_at.desc(), Community.id.desc())
             .limit(n)
-            .offset(offset)
         )
-        communities = result.scalars().all()
-
-        result_list = []
-        for c in communities:
-            is_joined = False
-            if user_id:
-                participant_result = await db.execute(
-                    select(ParticipantsLink).where(
-                        ParticipantsLink.community_id == c.id,
-                        ParticipantsLink.user_id == user_id
-                    )
-                )
-                is_joined = participant_result.scalars().first() is not None
-            
-            participant_count_result = await db.execute(
-                select(func.count(ParticipantsLink.user_id)).where(ParticipantsLink.community_id == c.id)
-            )
-            participant_count = participant_count_result.scalar() or 0
-            
-            post_count_result = await db.execute(
-                select(func.count(Post.id)).where(Post.community_id == c.id)
-            )
-            post_count = post_count_result.scalar() or 0
-            
-            result_list.append({
-                'id': c.id,
-                'name': c.name,
-                'description': c.description,
-                'participant_count': participant_count,
-                'post_count': post_count,
-                'joined': is_joined,
-            })
+        stmt = seek(stmt, [Community.created_at, Community.id], cursor) if cursor else stmt.offset(offset)
+        result = await db.execute(stmt)
+        rows = result.all()
 
-        return result_list
+        next_cursor = keyset_cursor([rows[-1].created_at, rows[-1].id]) if rows and len(rows) == n else None
+        return community_dicts(rows), next_cursor
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Could not list new communities: {e}')
-    
 
-async def list_popular_communities(n: int, offset: int, db: AsyncSession, user_id: int | None = None):
+
+async def list_popular_communities(
+    n: int,
+    offset: int,
+    db: AsyncSession,
+    user_id: int | None = None,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
     try:
-        subq = select(
-            ParticipantsLink.community_id,
-            func.count().label('participant_count')
-        ).group_by(ParticipantsLink.community_id).subquery()
-        
-        result = await db.execute(
-            select(Community)
-            .outerjoin(subq, Community.id == subq.c.community_id)
+        # scores come from hot_ranker.py and only move when a community's posts are voted on
+        stmt = (
+            community_listing(user_id)
+            .add_columns(CommunityHotScore.hot_score)
+            .join(CommunityHotScore, CommunityHotScore.community_id == Community.id)
             .order_by(
-                subq.c.participant_count.desc(),
-                Community.id.desc()
+                CommunityHotScore.hot_score.desc(),
+                CommunityHotScore.community_id.desc()
             )
             .limit(n)
-            .offset(offset)
         )
-        communities = result.scalars().all()
-
-        result_list = []
-        for c in communities:
-            is_joined = False
-            if user_id:
-                participant_result = await db.execute(
-                    select(ParticipantsLink).where(
-                        ParticipantsLink.community_id == c.id,
-                        ParticipantsLink.user_id == user_id
-                    )
-                )
-                is_joined = participant_result.scalars().first() is not None
-            
-            participant_count_result = await db.execute(
-                select(func.count(ParticipantsLink.user_id)).where(ParticipantsLink.community_id == c.id)
-            )
-            participant_count = participant_count_result.scalar() or 0
-            
-            post_count_result = await db.execute(
-                select(func.count(Post.id)).where(Post.community_id == c.id)
-            )
-            post_count = post_count_result.scalar() or 0
-            
-            result_list.append({
-                'id': c.id,
-                'name': c.name,
-                'description': c.description,
-                'participant_count': participant_count,
-                'post_count': post_count,
-                'joined': is_joined,
-            })
+        sort_key = [CommunityHotScore.hot_score, CommunityHotScore.community_id]
+        stmt = seek(stmt, sort_key, cursor) if cursor else stmt.offset(offset)
+        result = await db.execute(stmt)
+        rows = result.all()
 
-        return result_list
+        next_cursor = keyset_cursor([rows[-1].hot_score, rows[-1].id]) if rows and len(rows) == n else None
+        return community_dicts(rows), next_cursor
 
     except HTTPException:
         raise
@@ -948,101 +1163,45 @@ async def search_communities(query: str, n: int, db: AsyncSession, user_id: int
 
         ts_query = func.plainto_tsquery(language, query)
 
-        participants_subq = (
-            select(ParticipantsLink.community_id, func.count(ParticipantsLink.user_id).label('participant_count'))
-            .group_by(ParticipantsLink.community_id)
-            .subquery()
-        )
-
-        posts_subq = (
-            select(Post.community_id, func.count(Post.id).label('post_count'))
-            .group_by(Post.community_id)
-            .subquery()
-        )
-
-        stmt = (
-            select(Community, participants_subq.c.participant_count, posts_subq.c.post_count)
-            .outerjoin(participants_subq, Community.id == participants_subq.c.community_id)
-            .outerjoin(posts_subq, Community.id == posts_subq.c.community_id)
+        result = await db.execute(
+            community_listing(user_id)
             .where(Community.search_vector.op('@@')(ts_query))
             .order_by(func.ts_rank_cd(Community.search_vector, ts_query).desc())
             .limit(n)
         )
 
-        result = await db.execute(stmt)
-        rows = result.all()
-
-        joined_ids = set()
-        if user_id:
-            joined_result = await db.execute(
-                select(ParticipantsLink.community_id).where(ParticipantsLink.user_id == user_id)
-            )
-            joined_ids = {r[0] for r in joined_result.fetchall()}
-
-        previews = []
-        for row in rows:
-            community = row[0]
-            participant_count = row[1] or 0
-            post_count = row[2] or 0
-            
-            preview = CommunityPreview(
-                id=community.id,
-                name=community.name,
-                description=community.description,
-                participant_count=participant_count,
-                post_count=post_count,
-                joined=community.id in joined_ids,
-            )
-            previews.append(preview)
-
-        return previews
+        return [CommunityPreview(**community) for community in community_dicts(result.all())]
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Could not search communities: {e}')
-    
+
 
 async def fetch_new_community_posts(community_id: int, n: int, db: AsyncSession) -> List[PostPreview]:
     try:
-        vote_subq = (
-            select(Vote.post_id, func.count(Vote.id).label('n_votes'))
-            .group_by(Vote.post_id)
-            .subquery()
-        )
-
         stmt = (
-            select(Post, vote_subq.c.n_votes)
-            .outerjoin(vote_subq, Post.id == vote_subq.c.post_id)
+            select(Post)
             .options(selectinload(Post.community), defer(Post.embedding))
-            .where(Post.community_id == community_id)
+            .where(Post.community_id == community_id, Post.moderation_status == 'approved')
             .order_by(Post.created_at.desc())
             .limit(n)
         )
 
         result = await db.execute(stmt)
-        rows = result.all()
+        posts = result.scalars().all()
 
         previews = []
-        for row in rows:
-            post = row[0]
-            n_votes = row[1] or 0
-            
-            votes_result = await db.execute(
-                select(Vote.would_pay).where(Vote.post_id == post.id)
-            )
-            votes = [v[0] for v in votes_result.fetchall() if v[0] is not None]
-            med = float(np.median(votes)) if votes else 0.0
-            
+        for post in posts:
             preview = PostPreview(
-                post_id        = post.id             ,
-                name           = post.name           ,
-                contents       = post.contents       ,
-                n_votes        = n_votes             ,
-                median         = med                 ,
-                created_at     = post.created_at     ,
-                community_name = post.community.name ,
-                community_id   = post.community_id   ,
+                post_id        = post.id                      ,
+                name           = post.name                    ,
+                contents       = post.contents                ,
+                n_votes        = post.vote_count              ,
+                median         = post.would_pay_median or 0.0 ,
+                created_at     = post.created_at              ,
+                community_name = post.community.name          ,
+                community_id   = post.community_id            ,
             )
             previews.append(preview)
 
@@ -1056,44 +1215,29 @@ async def fetch_new_community_posts(community_id: int, n: int, db: AsyncSession)
 
 async def fetch_popular_community_posts(community_id: int, n: int, db: AsyncSession) -> List[PostPreview]:
     try:
-        vote_subq = (
-            select(Vote.post_id, func.count(Vote.id).label('n_votes'))
-            .group_by(Vote.post_id)
-            .subquery()
-        )
-
         stmt = (
-            select(Post, vote_subq.c.n_votes)
-            .outerjoin(vote_subq, Post.id == vote_subq.c.post_id)
+            select(Post)
+            .join(PostHotScore, PostHotScore.post_id == Post.id)
             .options(selectinload(Post.community), defer(Post.embedding))
-            .where(Post.community_id == community_id)
-            .order_by(vote_subq.c.n_votes.desc().nullslast())
+            .where(PostHotScore.community_id == community_id, Post.moderation_status == 'approved')
+            .order_by(PostHotScore.hot_score.desc(), PostHotScore.post_id.desc())
             .limit(n)
         )
 
         result = await db.execute(stmt)
-        rows = result.all()
+        posts = result.scalars().all()
 
         previews = []
-        for row in rows:
-            post = row[0]
-            n_votes = row[1] or 0
-            
-            votes_result = await db.execute(
-                select(Vote.would_pay).where(Vote.post_id == post.id)
-            )
-            votes = [v[0] for v in votes_result.fetchall() if v[0] is not None]
-            med = float(np.median(votes)) if votes else 0.0
-            
+        for post in posts:
             preview = PostPreview(
-                post_id        = post.id             ,
-                name           = post.name           ,
-                contents       = post.contents       ,
-                n_votes        = n_votes             ,
-                median         = med                 ,
-                created_at     = post.created_at     ,
-                community_name = post.community.name ,
-                community_id   = post.community_id   ,
+                post_id        = post.id                      ,
+                name           = post.name                    ,
+                contents       = post.contents                ,
+                n_votes        = post.vote_count              ,
+                median         = post.would_pay_median or 0.0 ,
+                created_at     = post.created_at              ,
+                community_name = post.community.name          ,
+                community_id   = post.community_id            ,
             )
             previews.append(preview)
 
@@ -1105,55 +1249,41 @@ async def fetch_popular_community_posts(community_id: int, n: int, db: AsyncSess
         raise HTTPException(status_code=500, detail=f'Could not fetch popular community posts: {e}')
 
 
-async def fetch_median_ascending_community_posts(community_id: int, n: int, db: AsyncSession) -> List[PostPreview]:
-    try:
-        vote_subq = (
-            select(Vote.post_id, func.count(Vote.id).label('n_votes'))
-            .group_by(Vote.post_id)
-            .subquery()
-        )
-
-        stmt = (
-            select(Post, vote_subq.c.n_votes)
-            .outerjoin(vote_subq, Post.id == vote_subq.c.post_id)
-            .options(selectinload(Post.community), defer(Post.embedding))
-            .where(Post.community_id == community_id)
-            .limit(n)
+async def fetch_median_community_posts(community_id: int, n: int, descending: bool, db: AsyncSession) -> List[PostPreview]:
+    # ordered over the whole community by the trigger-maintained median, posts without priced votes last;
+    # each direction has its own partial index (ix_posts_community_median_asc/_desc)
+    if descending:
+        order = (Post.would_pay_median.desc().nulls_last(), Post.id.desc())
+    else:
+        order = (Post.would_pay_median.asc().nulls_last(), Post.id.asc())
+
+    result = await db.execute(
+        select(Post)
+        .options(selectinload(Post.community), defer(Post.embedding))
+        .where(Post.community_id == community_id, Post.moderation_status == 'approved')
+        .order_by(*order)
+        .limit(n)
+    )
+    posts = result.scalars().all()
+
+    return [
+        PostPreview(
+            post_id        = post.id                      ,
+            name           = post.name                    ,
+            contents       = post.contents                ,
+            n_votes        = post.vote_count              ,
+            median         = post.would_pay_median or 0.0 ,
+            created_at     = post.created_at              ,
+            community_name = post.community.name          ,
+            community_id   = post.community_id            ,
         )
+        for post in posts
+    ]
 
-        result = await db.execute(stmt)
-        rows = result.all()
 
-        post_with_median = []
-        for row in rows:
-            post = row[0]
-            n_votes = row[1] or 0
-            
-            votes_result = await db.execute(
-                select(Vote.would_pay).where(Vote.post_id == post.id)
-            )
-            votes = [v[0] for v in votes_result.fetchall() if v[0] is not None]
-            med = float(np.median(votes)) if votes else 0.0
-            
-            post_with_median.append((post, n_votes, med))
-
-        post_with_median.sort(key=lambda x: x[2])
-
-        previews = []
-        for post, n_votes, med in post_with_median[:n]:
-            preview = PostPreview(
-                post_id        = post.id             ,
-                name           = post.name           ,
-                contents       = post.contents       ,
-                n_votes        = n_votes             ,
-                median         = med                 ,
-                created_at     = post.created_at     ,
-                community_name = post.community.name ,
-                community_id   = post.community_id   ,
-            )
-            previews.append(preview)
-
-        return previews
+async def fetch_median_ascending_community_posts(community_id: int, n: int, db: AsyncSession) -> List[PostPreview]:
+    try:
+        return await fetch_median_community_posts(community_id, n, False, db)
 
     except HTTPException:
         raise
@@ -1163,53 +1293,7 @@ async def fetch_median_ascending_community_posts(community_id: int, n: int, db:
 
 async def fetch_median_descending_community_posts(community_id: int, n: int, db: AsyncSession) -> List[PostPreview]:
     try:
-        vote_subq = (
-            select(Vote.post_id, func.count(Vote.id).label('n_votes'))
-            .group_by(Vote.post_id)
-            .subquery()
-        )
-
-        stmt = (
-            select(Post, vote_subq.c.n_votes)
-            .outerjoin(vote_subq, Post.id == vote_subq.c.post_id)
-            .options(selectinload(Post.community), defer(Post.embedding))
-            .where(Post.community_id == community_id)
-            .limit(n)
-        )
-
-        result = await db.execute(stmt)
-        rows = result.all()
-
-        post_with_median = []
-        for row in rows:
-            post = row[0]
-            n_votes = row[1] or 0
-            
-            votes_result = await db.execute(
-                select(Vote.would_pay).where(Vote.post_id == post.id)
-            )
-            votes = [v[0] for v in votes_result.fetchall() if v[0] is not None]
-            med = float(np.median(votes)) if votes else 0.0
-            
-            post_with_median.append((post, n_votes, med))
-
-        post_with_median.sort(key=lambda x: x[2], reverse=True)
-
-        previews = []
-        for post, n_votes, med in post_with_median[:n]:
-            preview = PostPreview(
-                post_id        = post.id             ,
-                name           = post.name           ,
-                contents       = post.contents       ,
-                n_votes        = n_votes             ,
-                median         = med                 ,
-                created_at     = post.created_at     ,
-                community_name = post.community.name ,
-                community_id   = post.community_id   ,
-            )
-            previews.append(preview)
-
-        return previews
+        return await fetch_median_community_posts(community_id, n, True, db)
 
     except HTTPException:
         raise
@@ -1221,20 +1305,22 @@ async def get_user_conversations(
     n: int,
     offset: int,
     db: AsyncSession,
-    user_id: int
+    user_id: int,
+    cursor: str | None = None,
 ):
     try:
-        result = await db.execute(
+        stmt = (
             select(Conversation)
             .join(ConversationParticipant)
             .options(
                 selectinload(Conversation.participants),
             )
             .where(ConversationParticipant.user_id == user_id)
-            .order_by(Conversation.created_at.desc())
+            .order_by(Conversation.created_at.desc(), Conversation.id.desc())
             .limit(n)
-            .offset(offset)
         )
+        stmt = seek(stmt, [Conversation.created_at, Conversation.id], cursor) if cursor else stmt.offset(offset)
+        result = await db.execute(stmt)
         conversations = result.scalars().all()
     
         formatted = []
@@ -1266,7 +1352,11 @@ async def get_user_conversations(
                 "other_user": other_user,
                 "last_message": last_message,
             })
-        return formatted
+
+        next_cursor = None
+        if conversations and len(conversations) == n:
+            next_cursor = keyset_cursor([conversations[-1].created_at, conversations[-1].id])
+        return formatted, next_cursor
 
     except HTTPException:
         raise
@@ -1326,15 +1416,17 @@ async def get_messages(
     offset: int,
     db: AsyncSession,
     user_id: int,
+    cursor: str | None = None,
 ):
     try:
-        result = await db.execute(
+        stmt = (
             select(Message)
             .where(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.asc())
+            .order_by(Message.created_at.asc(), Message.id.asc())
             .limit(n)
-            .offset(offset)
         )
+        stmt = seek(stmt, [Message.created_at, Message.id], cursor, descending=False) if cursor else stmt.offset(offset)
+        result = await db.execute(stmt)
         messages = result.scalars().all()
 
         formatted = []
@@ -1347,7 +1439,8 @@ async def get_messages(
                 "created_at": msg.created_at.isoformat() if msg.created_at else None,
             })
 
-        return formatted
+        next_cursor = keyset_cursor([messages[-1].created_at, messages[-1].id]) if messages and len(messages) == n else None
+        return formatted, next_cursor
 
     except HTTPException:
         raise
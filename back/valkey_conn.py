@@ -3,6 +3,7 @@ import json
 import asyncio
 from typing import List, Optional
 import redis.asyncio as redis
+from redis.exceptions import ResponseError
 from uuid import uuid4
 from os import environ as env
 from dotenv import load_dotenv
@@ -10,6 +11,14 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+# interactive requests (moderation, post creation) never queue behind bulk re-embedding
+EMBEDDING_LANES = {
+    "interactive": "embedding:tasks",
+    "bulk": "embedding:tasks:bulk",
+}
+EMBEDDING_GROUP = "embedding-workers"
+
+
 # def get_valkey_url():
 #     return f"redis://{env.get('VALKEY_HOST', 'localhost')}:{env.get('VALKEY_PORT', '6379')}"
 
@@ -25,67 +34,210 @@ class ValkeyClient:
         if self.redis:
             await self.redis.aclose()
     
-    async def enqueue_embedding_task(self, text: str) -> str:
+    async def ensure_embedding_group(self):
+        for stream in EMBEDDING_LANES.values():
+            if await self.redis.type(stream) not in ('stream', 'none'):
+                # leftover list from the old LPUSH/RPOP queue
+                await self.redis.delete(stream)
+            try:
+                await self.redis.xgroup_create(stream, EMBEDDING_GROUP, id='0', mkstream=True)
+            except ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    async def enqueue_embedding_task(self, text: str, reply_to: str, lane: str = "interactive", deadline: float = 0) -> str:
+        # deadline: unix time after which the caller has stopped waiting (0: none)
         task_id = str(uuid4())
-        task = {
-            "id": task_id,
-            "text": text,
-        }
-        await self.redis.lpush("embedding:tasks", json.dumps(task))
+        await self.redis.xadd(
+            EMBEDDING_LANES[lane], {"id": task_id, "text": text, "reply_to": reply_to, "deadline": deadline}
+        )
         return task_id
     
-    async def enqueue_embedding_batch(self, texts: List[str]) -> List[str]:
+    async def enqueue_embedding_batch(
+        self, texts: List[str], reply_to: str, lane: str = "interactive", deadline: float = 0
+    ) -> List[str]:
         task_ids = []
         pipeline = self.redis.pipeline()
         for text in texts:
             task_id = str(uuid4())
             task_ids.append(task_id)
-            task = {
-                "id": task_id,
-                "text": text,
-            }
-            pipeline.lpush("embedding:tasks", json.dumps(task))
+            pipeline.xadd(
+                EMBEDDING_LANES[lane], {"id": task_id, "text": text, "reply_to": reply_to, "deadline": deadline}
+            )
         await pipeline.execute()
         return task_ids
     
-    async def set_task_result(self, task_id: str, embedding: List[float], error: Optional[str] = None):
-        result = {
-            "status": "failed" if error else "done",
-            "embedding": embedding,
-            "error": error,
-        }
-        await self.redis.setex(f"embedding:result:{task_id}", 300, json.dumps(result))
-    
-    async def get_task_result(self, task_id: str) -> Optional[dict]:
-        result = await self.redis.get(f"embedding:result:{task_id}")
-        if result:
-            await self.redis.delete(f"embedding:result:{task_id}")
-            return json.loads(result)
-        return None
-    
-    async def pop_tasks_batch(self, batch_size: int = 32) -> List[dict]:
-        tasks = []
-        for _ in range(batch_size):
-            task_json = await self.redis.rpop("embedding:tasks")
-            if task_json:
-                tasks.append(json.loads(task_json))
-            else:
-                break
-        return tasks
-    
-    async def pop_tasks_with_timeout(self, timeout: float = 1.0) -> List[dict]:
+    async def push_task_results(self, results: List[tuple], ttl: int = 300):
+        # results: (reply_to, task_id, embedding, error); one RPUSH per waiting request
+        replies = {}
+        for reply_to, task_id, embedding, error in results:
+            replies.setdefault(reply_to, []).append(json.dumps({
+                "id": task_id,
+                "status": "failed" if error else "done",
+                "embedding": embedding,
+                "error": error,
+            }))
+        pipeline = self.redis.pipeline()
+        for reply_to, payloads in replies.items():
+            pipeline.rpush(reply_to, *payloads)
+            pipeline.expire(reply_to, ttl)
+        await pipeline.execute()
+
+    async def wait_task_results(self, reply_to: str, max_results: int, timeout: float) -> List[dict]:
+        # BLPOP and the draining LPOP travel in one pipeline, so a whole batch costs one round trip
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.blpop(reply_to, timeout=max(timeout, 0.01))
+        pipeline.lpop(reply_to, max(max_results - 1, 1))
+        first, rest = await pipeline.execute()
+        if not first:
+            return []
+        return [json.loads(item) for item in [first[1], *(rest or [])]]
+
+    async def discard_task_results(self, reply_to: str):
+        await self.redis.delete(reply_to)
+
+    async def embedding_queue_depth(self) -> dict:
+        # acked tasks are deleted, so XLEN is what is waiting or in flight
+        pipeline = self.redis.pipeline(transaction=False)
+        for stream in EMBEDDING_LANES.values():
+            pipeline.xlen(stream)
+        return dict(zip(EMBEDDING_LANES, await pipeline.execute()))
+
+    async def read_embedding_tasks(
+        self, consumer: str, lanes: List[str], count: int = 32, block_ms: Optional[int] = None
+    ) -> List[dict]:
+        streams = {EMBEDDING_LANES[lane]: '>' for lane in lanes}
+        lane_of = {stream: lane for lane, stream in EMBEDDING_LANES.items()}
+        response = await self.redis.xreadgroup(
+            EMBEDDING_GROUP, consumer, streams, count=count, block=block_ms
+        )
+        return [
+            {"msg_id": msg_id, "lane": lane_of[stream], **fields}
+            for stream, messages in response or []
+            for msg_id, fields in messages
+        ]
+
+    async def reclaim_embedding_tasks(self, consumer: str, min_idle_ms: int = 5000, count: int = 32) -> List[dict]:
+        # tasks delivered to a consumer that never acked them (crashed mid-batch)
         tasks = []
-        start = asyncio.get_event_loop().time()
-        while True:
-            task_json = await self.redis.rpop("embedding:tasks")
-            if task_json:
-                tasks.append(json.loads(task_json))
-            elapsed = asyncio.get_event_loop().time() - start
-            if not task_json or elapsed >= timeout or len(tasks) >= 32:
-                break
-            await asyncio.sleep(0.01)
+        for lane, stream in EMBEDDING_LANES.items():
+            response = await self.redis.xautoclaim(
+                stream, EMBEDDING_GROUP, consumer, min_idle_time=min_idle_ms, start_id='0-0', count=count
+            )
+            tasks.extend({"msg_id": msg_id, "lane": lane, **fields} for msg_id, fields in response[1] if fields)
         return tasks
 
+    async def refresh_embedding_tasks(self, consumer: str, tasks: List[dict]):
+        # re-claiming our own pending entries resets their idle time, so a slow batch is not reclaimed mid-way
+        pipeline = self.redis.pipeline(transaction=False)
+        for lane, stream in EMBEDDING_LANES.items():
+            msg_ids = [task["msg_id"] for task in tasks if task["lane"] == lane]
+            if msg_ids:
+                pipeline.xclaim(stream, EMBEDDING_GROUP, consumer, 0, msg_ids, justid=True)
+        await pipeline.execute()
+
+    async def ack_embedding_tasks(self, tasks: List[dict]):
+        if not tasks:
+            return
+        pipeline = self.redis.pipeline()
+        for lane, stream in EMBEDDING_LANES.items():
+            msg_ids = [task["msg_id"] for task in tasks if task["lane"] == lane]
+            if msg_ids:
+                pipeline.xack(stream, EMBEDDING_GROUP, *msg_ids)
+                pipeline.xdel(stream, *msg_ids)
+        await pipeline.execute()
+
+    async def get_cached_embeddings(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        values = await self.redis.mget([f'embedding:cache:{key}' for key in keys])
+        return [json.loads(v) if v else None for v in values]
+
+    async def set_cached_embeddings(self, embeddings: dict, ttl: int):
+        if not embeddings:
+            return
+        pipeline = self.redis.pipeline()
+        for key, embedding in embeddings.items():
+            pipeline.setex(f'embedding:cache:{key}', ttl, json.dumps(embedding))
+        await pipeline.execute()
+
+    async def get_redflag_version(self) -> Optional[str]:
+        return await self.redis.get('redflag:version')
+
+    async def set_redflag_version(self, version: str):
+        await self.redis.set('redflag:version', version)
+
+    @staticmethod
+    def _contacts_key(requester_id: int, community_id: int, post_id: int) -> str:
+        return f'contacts:{requester_id}:{community_id or 0}:{post_id or 0}'
+
+    async def get_contact_ranking(self, requester_id: int, community_id: int, post_id: int) -> Optional[List[int]]:
+        value = await self.redis.get(self._contacts_key(requester_id, community_id, post_id))
+        return json.loads(value) if value is not None else None
+
+    async def set_contact_ranking(
+        self, requester_id: int, community_id: int, post_id: int, business_ids: List[int], ttl: int
+    ):
+        # the ranking is indexed by requester and by every ranked business,
+        # so either side changing can find and drop it
+        key = self._contacts_key(requester_id, community_id, post_id)
+        pipeline = self.redis.pipeline()
+        pipeline.setex(key, ttl, json.dumps(business_ids))
+        pipeline.sadd(f'contacts:by_requester:{requester_id}', key)
+        pipeline.expire(f'contacts:by_requester:{requester_id}', ttl)
+        for business_id in business_ids:
+            pipeline.sadd(f'contacts:by_business:{business_id}', key)
+            pipeline.expire(f'contacts:by_business:{business_id}', ttl)
+        await pipeline.execute()
+
+    async def invalidate_contact_rankings(self, requester_id: Optional[int] = None, business_ids: List[int] = ()):
+        index_keys = [f'contacts:by_business:{business_id}' for business_id in business_ids]
+        if requester_id is not None:
+            index_keys.append(f'contacts:by_requester:{requester_id}')
+        if not index_keys:
+            return
+        keys = await self.redis.sunion(index_keys)
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def save_contact_snapshot(self, requester_id: int, business_ids: List[int], ttl: int) -> str:
+        snapshot_id = uuid4().hex
+        key = f'contacts:snapshot:{requester_id}:{snapshot_id}'
+        if business_ids:
+            pipeline = self.redis.pipeline()
+            pipeline.rpush(key, *business_ids)
+            pipeline.expire(key, ttl)
+            await pipeline.execute()
+        return snapshot_id
+
+    async def get_contact_snapshot_page(
+        self, requester_id: int, snapshot_id: str, offset: int, count: int
+    ) -> tuple[Optional[List[int]], int]:
+        # (None, 0) once the snapshot has expired
+        key = f'contacts:snapshot:{requester_id}:{snapshot_id}'
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.lrange(key, offset, offset + count - 1)
+        pipeline.llen(key)
+        page, total = await pipeline.execute()
+        if not total:
+            return None, 0
+        return [int(business_id) for business_id in page], total
+
+    async def get_post_businesses(self, post_id: int, variant: str) -> Optional[List[list]]:
+        value = await self.redis.hget(f'post:businesses:{post_id}', variant)
+        return json.loads(value) if value is not None else None
+
+    async def set_post_businesses(self, post_id: int, variant: str, matches: List[list], ttl: int):
+        # one hash per post, so any change to the post drops every cached variant at once
+        pipeline = self.redis.pipeline()
+        pipeline.hset(f'post:businesses:{post_id}', variant, json.dumps(matches))
+        pipeline.expire(f'post:businesses:{post_id}', ttl)
+        await pipeline.execute()
+
+    async def invalidate_post_businesses(self, post_ids: List[int]):
+        if post_ids:
+            await self.redis.delete(*[f'post:businesses:{post_id}' for post_id in post_ids])
+
     async def save_code_with_timeout(self, user_id: int, code: str, timeout: float = 10*60):
         await self.redis.setex(f'code:{user_id}', timeout, code)
 
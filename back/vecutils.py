@@ -6,80 +6,96 @@ from sqlalchemy.orm import selectinload
 from pgvector.sqlalchemy import Vector
 from typing import List
 import numpy as np
-import aiohttp
 
 import logging
 from schemas import *
 from postgres_conn import *
 from os import environ as env
 from red_flags import REDFLAG_TEXTS
+import red_flags
 from valkey_conn import valkey_client
+from embedding_cache import embedding_cache
+from embedding_scheduler import embedding_scheduler, collect_batch
+from embedding_backends import embedding_backend
 import asyncio
+import hashlib
+import time
 import json
+import os
+from uuid import uuid4
+import socket
+from redis.exceptions import ResponseError
 
 
 # place for all the LLM-powered utils
 
+EMBEDDING_TIMEOUT = float(env.get('EMBEDDING_TIMEOUT', 10))
+# a task idle this long belongs to a dead worker; well under EMBEDDING_TIMEOUT so the caller still gets
+# the result, while live workers keep their tasks fresh every third of it (see keep_tasks_claimed)
+EMBEDDING_RECLAIM_IDLE_MS = int(env.get('EMBEDDING_RECLAIM_IDLE_MS', 3000))
+EMBEDDING_RECLAIM_INTERVAL = float(env.get('EMBEDDING_RECLAIM_INTERVAL', 1))
+
 
 async def embed_text(text: str | List[str]) -> List:
-    logging.info(f"embed_text: START - texts={len(text) if isinstance(text, list) else 1}")
-    url = env.get('LLM_BASE_URL', 'http://ollama-service:11434')
-    model = env.get('LLM_MODEL', 'embeddinggemma')
-    logging.info(f"embed_text: url={url}, model={model}")
-    
-    connector = aiohttp.TCPConnector()
-    session = aiohttp.ClientSession(connector=connector)
+    texts = text if isinstance(text, list) else [text]
+    logging.info(f"embed_text: START - texts={len(texts)}, backend={embedding_backend.model_id}")
+    return await embedding_backend.embed(texts)
+
+
+async def _embed_via_worker(texts: List[str], lane: str = 'interactive') -> List:
+    loop = asyncio.get_running_loop()
+    timeout = EMBEDDING_TIMEOUT
+    deadline = loop.time() + timeout
+    # the same deadline in wall-clock time travels with the tasks, so workers skip them once nobody waits
+    task_deadline = time.time() + timeout
+    reply_to = f"embedding:reply:{uuid4()}"
+    task_ids = await valkey_client.enqueue_embedding_batch(texts, reply_to, lane, task_deadline)
+    pending = {task_id: i for i, task_id in enumerate(task_ids)}
+    retried = set()
+    results = [None] * len(texts)
+
     try:
-        full_url = f"{url}/api/embed"
-        logging.info(f"embed_text: POST to {full_url}")
-        
-        async with session.post(full_url,
-                               json={
-                                   'model': model,
-                                   'input': text,
-                               }, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-            resp.raise_for_status()
-            
-            data = await resp.json()
-            logging.info(f"vector length: {len(data['embeddings'][0])}")
-            return data['embeddings']
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise HTTPException(status_code=500, detail=f"Embedding computation timed out for {len(pending)} texts")
+
+            for result in await valkey_client.wait_task_results(reply_to, len(pending), remaining):
+                i = pending.pop(result["id"], None)
+                if i is None:
+                    continue
+                if result.get("status") == "done":
+                    results[i] = result["embedding"]
+                elif i not in retried:
+                    logging.warning(f"get_embeddings: task {result['id']} failed, retrying...")
+                    retried.add(i)
+                    pending[await valkey_client.enqueue_embedding_task(texts[i], reply_to, lane, task_deadline)] = i
+                else:
+                    raise HTTPException(status_code=500, detail=f"Embedding computation failed for task {result['id']}")
     finally:
-        await session.close()
-        logging.info("embed_text: session closed")
+        if pending:
+            await valkey_client.discard_task_results(reply_to)
+
+    return results
 
 
-# TODO : make a batching worker that would get tasks from different places in the app and return them in proper places after processing
+async def keep_tasks_claimed(consumer: str, tasks: List[dict]):
+    # runs beside a batch: an embedding call can outlast the reclaim idle time (OLLAMA_TIMEOUT, the retries)
+    while True:
+        await asyncio.sleep(EMBEDDING_RECLAIM_IDLE_MS / 3000)
+        try:
+            await valkey_client.refresh_embedding_tasks(consumer, tasks)
+        except Exception as e:
+            logging.warning(f"Worker: could not refresh task claims: {e}")
+
 
-# Wrapper for embed_text + the worker when it comes
-async def get_embeddings(texts: List[str], toworker: bool = True):
+# Wrapper for embed_text + the worker, with embedding_cache in front of both
+async def get_embeddings(texts: List[str], toworker: bool = True, lane: str = 'interactive'):
     logging.warning(f"get_embeddings: received texts type={type(texts)}, len={len(texts) if texts else 0}")
     logging.warning(f"get_embeddings: texts={texts}")
     try:
-        if not toworker:
-            emb = await embed_text(texts)
-            return emb
-        else:
-            task_ids = await valkey_client.enqueue_embedding_batch(texts)
-            results = []
-            for task_id in task_ids:
-                for attempt in range(2):
-                    for _ in range(50):
-                        result = await valkey_client.get_task_result(task_id)
-                        if result:
-                            break
-                        await asyncio.sleep(0.1)
-                    else:
-                        result = None
-                    
-                    if result and result.get("status") == "done":
-                        results.append(result["embedding"])
-                        break
-                    if attempt == 0 and result and result.get("status") == "failed":
-                        logging.warning(f"get_embeddings: task {task_id} failed, retrying...")
-                        await valkey_client.enqueue_embedding_task(texts[task_ids.index(task_id)])
-                    else:
-                        raise HTTPException(status_code=500, detail=f"Embedding computation failed for task {task_id}")
-            return results
+        compute = (lambda batch: _embed_via_worker(batch, lane)) if toworker else embed_text
+        return await embedding_cache.get_or_compute(embedding_backend.model_id, texts, compute)
 
     except HTTPException:
         raise
@@ -89,88 +105,197 @@ async def get_embeddings(texts: List[str], toworker: bool = True):
 
 async def run_embedding_worker():
     await valkey_client.connect()
-    logging.info("Embedding worker started, waiting for tasks...")
+    await valkey_client.ensure_embedding_group()
+    consumer = env.get('EMBEDDING_WORKER_NAME') or f"{socket.gethostname()}-{os.getpid()}"
+    last_reclaim = 0.0
+    logging.info(f"Embedding worker {consumer} started, waiting for tasks...")
     
     while True:
         try:
-            tasks = await valkey_client.pop_tasks_with_timeout(timeout=1.0)
-            
+            tasks = []
+            now = asyncio.get_running_loop().time()
+            if now - last_reclaim >= EMBEDDING_RECLAIM_INTERVAL:
+                last_reclaim = now
+                tasks = await valkey_client.reclaim_embedding_tasks(consumer, min_idle_ms=EMBEDDING_RECLAIM_IDLE_MS)
+                if tasks:
+                    logging.warning(f"Worker: reclaimed {len(tasks)} tasks from dead consumers")
+
+            if not tasks:
+                tasks = await collect_batch(consumer)
+
             if not tasks:
-                await asyncio.sleep(0.5)
                 continue
+
+            # callers that timed out have dropped their reply list; their tasks are only acked
+            expired = [task for task in tasks if 0 < float(task.get("deadline") or 0) < time.time()]
+            if expired:
+                logging.warning(f"Worker: dropping {len(expired)} tasks past their caller's deadline")
+                await valkey_client.ack_embedding_tasks(expired)
+                tasks = [task for task in tasks if task not in expired]
+                if not tasks:
+                    continue
             
             logging.info(f"Worker: got {len(tasks)} tasks, processing batch")
             
             texts = [task["text"] for task in tasks]
             task_ids = [task["id"] for task in tasks]
+            reply_tos = [task["reply_to"] for task in tasks]
             
+            claims = asyncio.create_task(keep_tasks_claimed(consumer, tasks))
             try:
+                started = asyncio.get_running_loop().time()
                 embeddings = await embed_text(texts)
-                for task_id, embedding in zip(task_ids, embeddings):
-                    await valkey_client.set_task_result(task_id, embedding)
+                embedding_scheduler.observe(len(texts), (asyncio.get_running_loop().time() - started) * 1000)
+                await valkey_client.push_task_results([
+                    (reply_to, task_id, embedding, None)
+                    for reply_to, task_id, embedding in zip(reply_tos, task_ids, embeddings)
+                ])
                 logging.info(f"Worker: completed {len(embeddings)} embeddings")
                 
             except Exception as e:
                 logging.error(f"Worker: batch failed, retrying one by one: {e}")
-                for task_id, text in zip(task_ids, texts):
+                results = []
+                for reply_to, task_id, text in zip(reply_tos, task_ids, texts):
                     for attempt in range(2):
                         try:
                             embedding = (await embed_text([text]))[0]
-                            await valkey_client.set_task_result(task_id, embedding)
+                            results.append((reply_to, task_id, embedding, None))
                             break
                         except Exception as inner_e:
                             if attempt == 1:
-                                await valkey_client.set_task_result(task_id, [], error=str(inner_e))
+                                results.append((reply_to, task_id, [], str(inner_e)))
                                 logging.error(f"Worker: task {task_id} failed after 2 attempts: {inner_e}")
+                await valkey_client.push_task_results(results)
+            finally:
+                claims.cancel()
+
+            await valkey_client.ack_embedding_tasks(tasks)
         
         except asyncio.CancelledError:
             logging.info("Worker: shutting down")
             break
+        except ResponseError as e:
+            logging.error(f"Worker: valkey error: {e}")
+            if 'NOGROUP' in str(e):
+                await valkey_client.ensure_embedding_group()
+            await asyncio.sleep(1)
         except Exception as e:
             logging.error(f"Worker: error: {e}")
             await asyncio.sleep(1)
 
 
-async def insert_redflag_intentions(db: AsyncSession):
-    logging.info(f"insert_redflag_intentions: processing {len(REDFLAG_TEXTS)} redflag intentions")
-    embeddings = await get_embeddings([rf[1] for rf in REDFLAG_TEXTS])
-    logging.info(f'Embeddings retrieved, size: {len(embeddings[0]) if embeddings else 0}')
+REDFLAG_SEED_LOCK = 7341001
 
-    try:
-        for label, emb in zip([rf[0] for rf in REDFLAG_TEXTS], embeddings):
-            flag = RedFlagIntent(
-                label = label,
-                embedding = emb
-            )
-            db.add(flag)
-        logging.info(f"Added {len(REDFLAG_TEXTS)} redflag intentions to session")
-            
-    except Exception as e:
-        logging.error(f"Error inserting redflag intentions: {e}")
-        raise
 
+def redflag_seed_version() -> str:
+    with open(red_flags.__file__, 'rb') as f:
+        content = f.read()
+    return hashlib.sha256(content + b'\x00' + embedding_backend.model_id.encode('utf-8')).hexdigest()
 
-async def search_sentiment(query_vector: List, limit: int, db: AsyncSession):
-    similarity_threshold = 0.5
-    
-    try:
-        distance = RedFlagIntent.embedding.cosine_distance(query_vector)
 
-        result = await db.execute(
-            select(RedFlagIntent.label)
-            .where(distance < (1 - similarity_threshold))
-            .order_by(distance)
-            .limit(limit)
+async def _redflag_seed_is_current(db: AsyncSession, version: str) -> bool:
+    result = await db.execute(
+        select(
+            func.count(RedFlagIntent.id),
+            func.count(RedFlagIntent.id).filter(RedFlagIntent.version == version),
         )
+    )
+    total, current = result.one()
+    return total == current == len(REDFLAG_TEXTS)
+
+
+async def seed_redflag_intentions():
+    # Runs in the background on startup: only re-embeds when red_flags.py or the model changed,
+    # and swaps the rows in one transaction so concurrent boots never leave duplicates behind.
+    version = redflag_seed_version()
+    try:
+        async with async_session() as db:
+            if await _redflag_seed_is_current(db, version):
+                logging.info(f"seed_redflag_intentions: version {version[:12]} already seeded")
+                await valkey_client.set_redflag_version(version)
+                return
+
+        logging.info(f"seed_redflag_intentions: embedding {len(REDFLAG_TEXTS)} redflag intentions")
+        embeddings = await get_embeddings([rf[1] for rf in REDFLAG_TEXTS], lane='bulk')
+
+        async with async_session() as db:
+            async with db.begin():
+                await db.execute(select(func.pg_advisory_xact_lock(REDFLAG_SEED_LOCK)))
+                if not await _redflag_seed_is_current(db, version):
+                    await db.execute(delete(RedFlagIntent))
+                    db.add_all([
+                        RedFlagIntent(label=label, embedding=emb, version=version)
+                        for (label, _), emb in zip(REDFLAG_TEXTS, embeddings)
+                    ])
+
+        await valkey_client.set_redflag_version(version)
+        logging.info(f"seed_redflag_intentions: seeded version {version[:12]}")
 
-        return result.scalar_one_or_none()
-        
     except Exception as e:
-        logging.error(f'Could not search sentiment: {e}')
-        raise HTTPException(status_code=500, detail=f'Could not search sentiment: {e}')
+        logging.error(f"Error seeding redflag intentions: {e}")
+
 
+class RedFlagMatcher:
+    # RedFlagIntent is tiny and static: keep it as one unit-normalized matrix in memory
+    # and score every argument with a single matrix multiply instead of a pgvector query each.
 
-async def sentiment_check(db: AsyncSession, *args) -> bool:
+    def __init__(self, threshold: float, refresh_interval: float):
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.labels: List[str] = []
+        self.matrix: np.ndarray | None = None
+        self.version: str | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    async def load(self, version: str | None = None):
+        async with async_session() as db:
+            result = await db.execute(select(RedFlagIntent.label, RedFlagIntent.embedding))
+            rows = result.all()
+
+        self.labels = [label for label, _ in rows]
+        self.matrix = self._normalize([emb for _, emb in rows]) if rows else np.zeros((0, 0), dtype=np.float32)
+        self.version = version
+        logging.info(f"RedFlagMatcher: loaded {len(self.labels)} intents, version={version}")
+
+    async def ensure_fresh(self):
+        # the seeding step publishes a version in valkey; reload when it moves
+        loop = asyncio.get_running_loop()
+        if self.matrix is not None and loop.time() - self._checked_at < self.refresh_interval:
+            return
+        async with self._lock:
+            if self.matrix is not None and loop.time() - self._checked_at < self.refresh_interval:
+                return
+            version = await valkey_client.get_redflag_version()
+            if self.matrix is None or version != self.version:
+                await self.load(version)
+            self._checked_at = loop.time()
+
+    def match(self, vectors: List) -> List[str | None]:
+        if not len(self.labels) or not len(vectors):
+            return [None] * len(vectors)
+        sims = self._normalize(vectors) @ self.matrix.T
+        best = sims.argmax(axis=1)
+        return [
+            self.labels[j] if sims[i, j] > self.threshold else None
+            for i, j in enumerate(best)
+        ]
+
+
+redflag_matcher = RedFlagMatcher(
+    threshold=float(env.get('REDFLAG_SIMILARITY_THRESHOLD', 0.5)),
+    refresh_interval=float(env.get('REDFLAG_REFRESH_SECONDS', 60)),
+)
+
+
+async def sentiment_check(*args) -> bool:
     flat_args = []
     for arg in args:
         if isinstance(arg, (list, tuple)):
@@ -179,12 +304,17 @@ async def sentiment_check(db: AsyncSession, *args) -> bool:
             flat_args.append(str(arg))
     embs = await get_embeddings(flat_args)
 
-    lebels = []
-    for e in embs:
-        l = await search_sentiment(e, 1, db)
-        logging.warning(f'sentiment check: {l}')
-        if l:
-            return False
+    try:
+        await redflag_matcher.ensure_fresh()
+    except Exception as e:
+        logging.error(f'Could not refresh red flag intents: {e}')
+        if redflag_matcher.matrix is None:
+            raise HTTPException(status_code=500, detail=f'Could not search sentiment: {e}')
+
+    labels = [l for l in redflag_matcher.match(embs) if l]
+    if labels:
+        logging.warning(f'sentiment check: {labels}')
+        return False
 
     return True
 